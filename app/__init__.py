@@ -7,6 +7,15 @@ from config import config
 from flask_login import LoginManager
 from flask_pagedown import PageDown
 from flask_sslify import SSLify
+from .presence import LastSeenBuffer
+from .fragments import FragmentCache
+from .page_cache import PageCache
+from .identity import IdentityCache, CredentialCache
+from .metrics import Metrics
+from .nplusone import QueryShapeDetector
+from .search import SearchIndex
+from .follow_graph import FollowGraph
+from .vote_buffer import VoteBuffer
 
 
 bootstrap = Bootstrap()
@@ -17,6 +26,16 @@ log_manager = LoginManager()
 log_manager.session_protection = 'strong'
 log_manager.login_view = 'auth.login'
 pagedown = PageDown()
+last_seen_buffer = LastSeenBuffer()
+fragment_cache = FragmentCache()
+page_cache = PageCache()
+identity_cache = IdentityCache()
+credential_cache = CredentialCache()
+metrics = Metrics()
+query_shape_detector = QueryShapeDetector()
+search_index = SearchIndex()
+follow_graph = FollowGraph()
+vote_buffer = VoteBuffer()
 
 
 def create_app(config_name='default'):
@@ -28,8 +47,20 @@ def create_app(config_name='default'):
     moment.init_app(app)
     db.init_app(app)
     mail.init_app(app)
+    from .email import mail_queue
+    mail_queue.init_app(app)
     log_manager.init_app(app)
     pagedown.init_app(app)
+    last_seen_buffer.init_app(app)
+    fragment_cache.init_app(app)
+    page_cache.init_app(app)
+    identity_cache.init_app(app)
+    credential_cache.init_app(app)
+    metrics.init_app(app)
+    query_shape_detector.init_app(app)
+    search_index.init_app(app)
+    follow_graph.init_app(app)
+    vote_buffer.init_app(app)
     sslify = SSLify(app)
 
     from .main import main
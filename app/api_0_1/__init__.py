@@ -2,4 +2,4 @@ from flask import Blueprint
 
 api = Blueprint('api', __name__)
 
-from . import authentication, questions, users, comments, errors
\ No newline at end of file
+from . import authentication, questions, answers, users, comments, votes, search, export, errors
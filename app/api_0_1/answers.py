@@ -0,0 +1,23 @@
+from . import api
+from .. import vote_buffer
+from ..models import Answer
+from flask import jsonify
+from .authentication import auth
+from .conditional import check_version, versioned, with_validators
+
+
+@api.route('/answers/<int:id>')
+@auth.login_required
+def get_answer(id):
+    pending = vote_buffer.pending(id)
+    if not pending:
+        response = check_version(Answer, id)
+        if response is not None:
+            return response
+    answer = Answer.query.get_or_404(id)
+    response = jsonify(answer.to_json())
+    if pending:
+        # unflushed votes are in vote_count but not yet in the version, so
+        # validate by content until they are written
+        return with_validators(response)
+    return versioned(response, Answer, id, answer.version, answer.updated_at)
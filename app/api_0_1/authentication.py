@@ -1,5 +1,7 @@
 from flask_httpauth import HTTPBasicAuth
-from flask import g, jsonify
+import time
+from flask import g, jsonify, current_app
+from .. import identity_cache, credential_cache
 from ..models import User, AnonymousUser
 from .errors import unauthorized, forbidden
 from . import api
@@ -12,21 +14,35 @@ def verify_password(email_or_token, password):
     if email_or_token == '':
         g.current_user = AnonymousUser()
         return True
+    cached = credential_cache.get(email_or_token, password)
+    if cached is not None:
+        g.current_user, g.token_used = cached
+        return True
     if password == '':
-        g.current_user = User.verify_auth_token(email_or_token)
+        user_id, expiration = User.load_auth_token(email_or_token)
+        g.current_user = identity_cache.load_user(user_id) if user_id else None
         g.token_used = True
-        return g.current_user is not None
+        if g.current_user is None:
+            return False
+        credential_cache.set(email_or_token, password, g.current_user,
+                             expiration, True)
+        return True
     user = User.query.filter_by(email=email_or_token).first()
     if not user:
         return False
     g.current_user = user
     g.token_used = False
-    return user.verify_password(password)
+    if not user.verify_password(password):
+        return False
+    credential_cache.set(email_or_token, password, user,
+                         time.time() + current_app.config['FLASK_CREDENTIAL_CACHE_TTL'],
+                         False)
+    return True
 
 
 @api.route('/token')
 def get_token():
-    if g.current_user.is_anonymous or g.token_uset:
+    if g.current_user.is_anonymous or g.token_used:
         return unauthorized('Invalid credentials')
     return jsonify({'token': g.current_user.generate_auth_token(expiration=3600),
                     'expiration': 3600})
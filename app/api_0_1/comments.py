@@ -1,13 +1,46 @@
 from . import api
-from ..models import Question, Permission
+from ..models import Question, Answer, Comment, Permission
 from flask import request, jsonify, url_for, current_app
 from .. import db
 from .authentication import auth
 from .decorators import permission_required
 from .errors import forbidden
+from .conditional import check_version, versioned
 
 
 @api.route('/get_question_comments/<int:id>')
 @auth.login_required
 def get_question_comments(id):
-    pass
\ No newline at end of file
+    pass
+
+
+@api.route('/comments/<int:id>')
+@auth.login_required
+def get_comment(id):
+    response = check_version(Comment, id)
+    if response is not None:
+        return response
+    comment = Comment.query.get_or_404(id)
+    return versioned(jsonify(comment.to_json()), Comment, id, comment.version,
+                     comment.updated_at)
+
+
+@api.route('/answers/<int:id>/comments/')
+@auth.login_required
+def get_answer_comments(id):
+    answer = Answer.query.get_or_404(id)
+    page = request.args.get('page', 1, type=int)
+    pagination = answer.comments.order_by(Comment.timestamp.asc(), Comment.id.asc())\
+        .paginate(page, per_page=current_app.config['FLASK_COMMENTS_PER_PAGE'],
+                  error_out=False)
+    prev = None
+    if pagination.has_prev:
+        prev = url_for('api.get_answer_comments', id=id, page=page - 1, _external=True)
+    next = None
+    if pagination.has_next:
+        next = url_for('api.get_answer_comments', id=id, page=page + 1, _external=True)
+    return jsonify({
+        'comments': [comment.to_json() for comment in pagination.items],
+        'prev': prev,
+        'next': next,
+        'count': pagination.total})
@@ -0,0 +1,66 @@
+import hashlib
+from flask import request, current_app, abort
+from werkzeug.http import is_resource_modified
+from .. import db
+
+
+def _validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def version_etag(*parts):
+    """Strong ETag for a representation built from rows at the given versions."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """A 304 response if the client's validators still match, else None.
+
+    Called before anything is loaded or serialized, so a polling client
+    that is up to date costs only the version lookup.
+    """
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return _validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def with_validators(response, etag=None, last_modified=None):
+    """Attach validators to a 200 response; without ``etag`` hash the body."""
+    if etag is None:
+        response.add_etag()
+        etag = response.get_etag()[0]
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+    return _validators(response, etag, last_modified).make_conditional(request)
+
+
+def is_conditional():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def check_version(model, id):
+    """304 for a conditional GET of an unchanged ``model`` row, else None.
+
+    Only the row's version and updated_at are read, by primary key.
+    """
+    if not is_conditional():
+        return None
+    row = db.session.query(model.version, model.updated_at)\
+        .filter(model.id == id).first()
+    if row is None:
+        abort(404)
+    return not_modified(version_etag(model.__tablename__, id, row.version),
+                        row.updated_at)
+
+
+def versioned(response, model, id, version, updated_at):
+    """Attach the validators :func:`check_version` compares against."""
+    return with_validators(response, version_etag(model.__tablename__, id, version),
+                           updated_at)
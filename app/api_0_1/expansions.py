@@ -0,0 +1,36 @@
+from flask import request, current_app
+from ..exceptions import ValidationError
+
+
+def requested_ids():
+    """Ids from ``?ids=1,2,3`` in request order, or None when absent."""
+    raw = request.args.get('ids')
+    if raw is None:
+        return None
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ValidationError('ids must be a comma separated list of integers')
+    if len(ids) > current_app.config['FLASK_API_MAX_IDS']:
+        raise ValidationError('at most %d ids per request'
+                              % current_app.config['FLASK_API_MAX_IDS'])
+    unique = []
+    for id in ids:
+        if id not in unique:
+            unique.append(id)
+    return unique
+
+
+def requested_expansions(allowed):
+    """Names from ``?expand=author,top_answers``, restricted to ``allowed``."""
+    names = set(name.strip() for name in request.args.get('expand', '').split(',')
+                if name.strip())
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValidationError('cannot expand %s' % ', '.join(sorted(unknown)))
+    return names
+
+
+def in_order(items, ids):
+    by_id = dict((item.id, item) for item in items)
+    return [by_id[id] for id in ids if id in by_id]
@@ -0,0 +1,16 @@
+from . import api
+from flask import request, current_app, stream_with_context, abort
+from .decorators import admin_required
+from ..export import EXPORTS, parse_since, export_rows, ndjson
+
+
+@api.route('/export/<entity>')
+@admin_required
+def export(entity):
+    if entity not in EXPORTS:
+        abort(404)
+    rows = export_rows(entity, parse_since(request.args.get('since')),
+                       request.args.get('since_id', type=int),
+                       current_app.config['FLASK_EXPORT_CHUNK_SIZE'])
+    return current_app.response_class(stream_with_context(ndjson(rows)),
+                                      mimetype='application/x-ndjson')
@@ -1,10 +1,18 @@
 from . import api
 from ..models import Question, Permission
-from flask import request, jsonify, url_for, current_app, g
+from flask import request, jsonify, url_for, current_app, g, abort
 from .. import db
 from .authentication import auth
 from .decorators import permission_required
 from .errors import forbidden
+from ..pagination import paginate, KeysetPagination
+from .expansions import requested_ids, requested_expansions
+from .serializers import question_query, questions_by_id, questions_json, \
+    json_response, QUESTION_COLUMNS, QUESTION_VERSION_COLUMNS
+from .conditional import is_conditional, check_version, versioned, version_etag, \
+    not_modified, with_validators
+
+EXPANSIONS = ('author', 'top_answers')
 
 
 @api.route('/questions/', methods=['POST'])
@@ -28,8 +36,20 @@ def new_question():
 @api.route('/questions/<int:id>')
 @auth.login_required
 def get_question(id):
-    question = Question.query.get_or_404(id)
-    return jsonify(question.to_json())
+    expand = requested_expansions(EXPANSIONS)
+    if not expand:
+        response = check_version(Question, id)
+        if response is not None:
+            return response
+    rows = questions_by_id([id])
+    if not rows:
+        abort(404)
+    response = json_response(questions_json(rows, expand)[0])
+    if expand:
+        # embedded authors and answers carry no version here, so validate
+        # expanded representations by their content instead
+        return with_validators(response)
+    return versioned(response, Question, id, rows[0].version, rows[0].updated_at)
 
 
 @api.route('/questions/<int:id>', methods=['PUT'])
@@ -49,22 +69,61 @@ def edit_question(id):
 # @permission_required(Permission.ADMINISTER)
 @auth.login_required
 def get_questions():
-    page = request.args.get('page', 1, type=int)
-    pagination = Question.query.paginate(
-        page, per_page=current_app.config['FLASK_POSTS_PER_PAGE'],
-        error_out=False)
+    expand = requested_expansions(EXPANSIONS)
+    ids = requested_ids()
+    # a conditional request first reads only ids and versions, and loads
+    # the questions themselves once it knows the client's copy is stale
+    light = is_conditional() and not expand
+    if ids is not None:
+        if light:
+            questions = question_query(QUESTION_VERSION_COLUMNS)\
+                .filter(Question.id.in_(ids)).all() if ids else []
+        else:
+            questions = questions_by_id(ids)
+        return questions_response(questions, ids, expand, light)
+    query = question_query(QUESTION_VERSION_COLUMNS if light else QUESTION_COLUMNS)
+    pagination = paginate(query, Question.timestamp, Question.id,
+                          per_page=current_app.config['FLASK_POSTS_PER_PAGE'])
     questions = pagination.items
+    if isinstance(pagination, KeysetPagination):
+        prev_args = {'cursor': pagination.prev_cursor}
+        next_args = {'cursor': pagination.next_cursor}
+        count = None
+    else:
+        prev_args = {'page': pagination.prev_num}
+        next_args = {'page': pagination.next_num}
+        count = pagination.total
+    if expand:
+        prev_args['expand'] = next_args['expand'] = request.args['expand']
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_questions', page=page+1, _external=True)
+        prev = url_for('api.get_questions', _external=True, **prev_args)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_questions', page=page+1, _external=True)
-    return jsonify({
-        'questions': [question.to_json() for question in questions],
-        'prev': prev,
-        'next': next,
-        'count': pagination.total})
+        next = url_for('api.get_questions', _external=True, **next_args)
+    return questions_response(questions, [question.id for question in questions],
+                              expand, light, prev=prev, next=next, count=count)
+
+
+def questions_response(questions, ids, expand, light, **extra):
+    """List response for ``questions``, or 304 when the client's copy is current.
+
+    The ETag covers the id and version of every listed question plus the
+    paging links and count. No Last-Modified is sent for lists, since a
+    question dropping out of the list would not move it.
+    """
+    etag = None
+    if not expand:
+        by_id = dict((question.id, question.version) for question in questions)
+        etag = version_etag('questions', [(id, by_id[id]) for id in ids if id in by_id],
+                            sorted(extra.items()))
+        if light:
+            response = not_modified(etag)
+            if response is not None:
+                return response
+            questions = questions_by_id(ids)
+    payload = dict(extra, questions=questions_json(questions, expand))
+    return with_validators(json_response(payload), etag)
 
 
 @api.route('/get_user_followed_questions/<int:id>')
@@ -0,0 +1,29 @@
+from . import api
+from flask import request, jsonify, url_for
+from .. import search_index
+from .authentication import auth
+
+
+@api.route('/search')
+@auth.login_required
+def search():
+    q = request.args.get('q', u'').strip()
+    page = request.args.get('page', 1, type=int)
+    pagination = search_index.search(q, page)
+    prev = None
+    if pagination.has_prev:
+        prev = url_for('api.search', q=q, page=page - 1, _external=True)
+    next = None
+    if pagination.has_next:
+        next = url_for('api.search', q=q, page=page + 1, _external=True)
+    return jsonify({
+        'results': [{'kind': result.kind,
+                     'id': result.id,
+                     'question': url_for('api.get_question', id=result.question.id,
+                                         _external=True),
+                     'title': result.question.title,
+                     'snippet': result.snippet,
+                     'rank': result.rank} for result in pagination.items],
+        'prev': prev,
+        'next': next,
+        'count': pagination.total})
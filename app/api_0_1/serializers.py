@@ -0,0 +1,144 @@
+from flask import g, url_for, json, current_app
+from .. import db, vote_buffer
+from ..models import User, UserStats, Question, Answer
+from .expansions import in_order
+
+_PLACEHOLDER = 987654321
+
+QUESTION_COLUMNS = (Question.id, Question.title, Question.body, Question.body_html,
+                    Question.timestamp, Question.author_id, Question.version,
+                    Question.updated_at)
+QUESTION_VERSION_COLUMNS = (Question.id, Question.timestamp, Question.version)
+ANSWER_COLUMNS = (Answer.id, Answer.body, Answer.body_html, Answer.timestamp,
+                  Answer.vote_count, Answer.author_id, Answer.question_id)
+USER_COLUMNS = (User.id, User.username, User.member_since, User.last_seen) + \
+    tuple(getattr(UserStats, name) for name in UserStats.counters)
+
+
+def url_template(endpoint):
+    """``url_for(endpoint, id=...)`` as a ``%d`` template, built once per request."""
+    templates = getattr(g, 'url_templates', None)
+    if templates is None:
+        templates = g.url_templates = {}
+    template = templates.get(endpoint)
+    if template is None:
+        url = url_for(endpoint, id=_PLACEHOLDER, _external=True)
+        template = templates[endpoint] = \
+            url.replace('%', '%%').replace(str(_PLACEHOLDER), '%d')
+    return template
+
+
+def json_response(payload, status=200):
+    """Compact JSON response, skipping jsonify's pretty printing."""
+    return current_app.response_class(json.dumps(payload, separators=(',', ':')),
+                                      status=status, mimetype='application/json')
+
+
+def question_query(columns=QUESTION_COLUMNS):
+    # through Question.query so page-number mode can still call paginate()
+    return Question.query.with_entities(*columns)
+
+
+def questions_by_id(ids):
+    if not ids:
+        return []
+    return in_order(question_query().filter(Question.id.in_(ids)), ids)
+
+
+def users_json(ids):
+    """Serialize users by id in ``ids`` order, with one query."""
+    if not ids:
+        return []
+    rows = db.session.query(*USER_COLUMNS)\
+        .outerjoin(UserStats, UserStats.user_id == User.id)\
+        .filter(User.id.in_(set(ids)))
+    url = url_template('api.get_user')
+    followed_questions = url_template('api.get_user_followed_questions')
+    result = []
+    for row in in_order(rows, ids):
+        json_user = {
+            'url': url % row.id,
+            'username': row.username,
+            'member_since': row.member_since,
+            'last_seen': row.last_seen,
+            'followed_questions': followed_questions % row.id}
+        for name in UserStats.counters:
+            json_user[name] = getattr(row, name) or 0
+        result.append(json_user)
+    return result
+
+
+def top_answer_rows(question_ids, limit_row):
+    """The ``limit_row`` best answers per question as column tuples."""
+    top_answers = dict((question_id, []) for question_id in question_ids)
+    if not question_ids or limit_row <= 0:
+        return top_answers
+    rank = db.func.row_number().over(
+        partition_by=Answer.question_id,
+        order_by=(Answer.vote_count.desc(), Answer.id)).label('rank')
+    ranked = db.session.query(*(ANSWER_COLUMNS + (rank,)))\
+        .filter(Answer.question_id.in_(question_ids)).subquery()
+    rows = db.session.query(ranked).filter(ranked.c.rank <= limit_row)\
+        .order_by(ranked.c.question_id, ranked.c.rank)
+    for row in rows:
+        top_answers[row.question_id].append(row)
+    return top_answers
+
+
+def questions_json(rows, expand=()):
+    """Serialize question rows from :func:`question_query`.
+
+    Nothing is hydrated into ORM objects: answer and comment counts come
+    from grouped queries, embedded answers and authors from one query each,
+    and URLs from per-request templates, so a page costs the same handful
+    of statements whatever its size.
+    """
+    ids = [row.id for row in rows]
+    answer_counts = Question.answer_counts(ids)
+    top_answers = {}
+    comment_counts = {}
+    if 'top_answers' in expand:
+        top_answers = top_answer_rows(ids, current_app.config['FLASK_API_TOP_ANSWERS'])
+        comment_counts = Answer.comment_counts(
+            [answer.id for answers in top_answers.values() for answer in answers])
+    authors = {}
+    if 'author' in expand:
+        author_ids = [row.author_id for row in rows] + \
+            [answer.author_id for answers in top_answers.values() for answer in answers]
+        authors = dict((user['url'], user) for user in users_json(author_ids))
+
+    question_url = url_template('api.get_question')
+    answer_url = url_template('api.get_answer')
+    comments_url = url_template('api.get_answer_comments')
+    user_url = url_template('api.get_user')
+
+    def author(author_id):
+        if author_id is None:
+            return None
+        url = user_url % author_id
+        return authors.get(url, url)
+
+    result = []
+    for row in rows:
+        json_question = {
+            'url': question_url % row.id,
+            'title': row.title,
+            'body': row.body,
+            'body_html': row.body_html,
+            'timestamp': row.timestamp,
+            'author': author(row.author_id),
+            'answer_count': answer_counts[row.id]}
+        if 'top_answers' in expand:
+            json_question['top_answers'] = [{
+                'url': answer_url % answer.id,
+                'body': answer.body,
+                'body_html': answer.body_html,
+                'timestamp': answer.timestamp,
+                'vote_count': answer.vote_count + vote_buffer.pending(answer.id),
+                'author': author(answer.author_id),
+                'question': question_url % row.id,
+                'comments': comments_url % answer.id,
+                'comment_count': comment_counts[answer.id]}
+                for answer in top_answers[row.id]]
+        result.append(json_question)
+    return result
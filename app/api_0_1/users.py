@@ -1,13 +1,25 @@
 from . import api
-from ..models import Question, Permission
+from ..models import User, Question, Permission
 from flask import request, jsonify, url_for, current_app
 from .. import db
 from .authentication import auth
 from .decorators import permission_required
-from .errors import forbidden
+from .errors import forbidden, bad_request
+from .expansions import requested_ids
+from .serializers import users_json, json_response
 
 
 @api.route('/get_user/<int:id>')
 @auth.login_required
 def get_user(id):
-    pass
\ No newline at end of file
+    user = User.query.get_or_404(id)
+    return jsonify(user.to_json())
+
+
+@api.route('/users/')
+@auth.login_required
+def get_users():
+    ids = requested_ids()
+    if ids is None:
+        return bad_request('ids is required')
+    return json_response({'users': users_json(ids)})
@@ -0,0 +1,24 @@
+from . import api
+from .. import vote_buffer
+from flask import request, jsonify, g, current_app
+from .authentication import auth
+from .errors import bad_request, unauthorized
+
+
+@api.route('/votes/', methods=['POST'])
+@auth.login_required
+def new_votes():
+    if g.current_user.is_anonymous:
+        return unauthorized('Invalid credentials')
+    answer_ids = (request.get_json(silent=True) or {}).get('answer_ids')
+    if not isinstance(answer_ids, list) or \
+            not all(isinstance(id, int) for id in answer_ids):
+        return bad_request('answer_ids must be a list of integers')
+    if len(answer_ids) > current_app.config['FLASK_API_MAX_IDS']:
+        return bad_request('at most %d answer_ids per request'
+                           % current_app.config['FLASK_API_MAX_IDS'])
+    accepted = vote_buffer.add_many(g.current_user.id, answer_ids)
+    response = jsonify({'accepted': sorted(accepted),
+                        'ignored': sorted(set(answer_ids) - set(accepted))})
+    response.status_code = 202
+    return response
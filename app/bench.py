@@ -0,0 +1,249 @@
+import base64
+import json
+import math
+import os
+import random
+import threading
+import time
+from sqlalchemy.engine import ResultProxy
+from . import db
+from .models import Role, User, Question
+
+DEFAULT_ROUTES = ('/', '/square', '/question/<question>', '/user/<username>',
+                  '/followers/<username>', '/api/v1.0/questions/',
+                  '/api/v1.0/questions/<question>')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+class QueryCounter(object):
+    """Counts SQL statements, result rows and ORM objects of the current thread.
+
+    SQLAlchemy has no per-row event, so rows are counted by wrapping
+    ``ResultProxy.process_rows`` while the counter is active; that sees
+    every row fetched from ``engine``, including those of column
+    projections that never build an ORM object.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = threading.local()
+        self._process_rows = None
+
+    def __enter__(self):
+        db.event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        db.event.listen(db.Model, 'load', self._on_load, propagate=True)
+        self._process_rows = ResultProxy.__dict__['process_rows']
+        ResultProxy.process_rows = self._wrap(self._process_rows)
+        return self
+
+    def __exit__(self, *exc_info):
+        db.event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        db.event.remove(db.Model, 'load', self._on_load)
+        ResultProxy.process_rows = self._process_rows
+
+    def reset(self):
+        self._local.statements = 0
+        self._local.rows = 0
+        self._local.objects = 0
+
+    def read(self):
+        return (getattr(self._local, 'statements', 0), getattr(self._local, 'rows', 0),
+                getattr(self._local, 'objects', 0))
+
+    def _add(self, name, n):
+        setattr(self._local, name, getattr(self._local, name, 0) + n)
+
+    def _wrap(self, process_rows):
+        counter = self
+
+        def wrapper(proxy, rows):
+            processed = process_rows(proxy, rows)
+            if proxy.context.engine is counter.engine:
+                counter._add('rows', len(processed))
+            return processed
+        return wrapper
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._add('statements', 1)
+
+    def _on_load(self, target, context):
+        self._add('objects', 1)
+
+
+class RouteBenchmark(object):
+    """Drive the app through the test client and time each route.
+
+    Route patterns may contain ``<question>`` and ``<username>``; every
+    request substitutes a random existing question id or username, so the
+    numbers are not just those of one hot page.
+    """
+
+    def __init__(self, app, routes=DEFAULT_ROUTES, requests=200, concurrency=4,
+                 anonymous=False, seed=0):
+        self.app = app
+        self.routes = list(routes)
+        self.requests = requests
+        self.concurrency = concurrency
+        self.anonymous = anonymous
+        self.rng = random.Random(seed)
+
+    def _targets(self):
+        with self.app.app_context():
+            question_ids = [row[0] for row in db.session.query(Question.id)]
+            usernames = [row[0] for row in db.session.query(User.username)]
+            user = User.query.filter_by(role=Role.query.filter_by(default=True).first())\
+                .order_by(User.id).first()
+            email = user.email if user else None
+            db.session.remove()
+        return question_ids, usernames, email
+
+    def _url(self, route, question_ids, usernames):
+        if '<question>' in route:
+            route = route.replace('<question>', str(self.rng.choice(question_ids)))
+        if '<username>' in route:
+            route = route.replace('<username>', self.rng.choice(usernames))
+        return route
+
+    def _client(self, email, password):
+        client = self.app.test_client()
+        if email and not self.anonymous:
+            client.post('/auth/login', base_url='https://localhost',
+                        data={'email': email, 'password': password})
+        return client
+
+    def _run_route(self, route, question_ids, usernames, email, password, counter):
+        urls = [self._url(route, question_ids, usernames) for i in range(self.requests)]
+        headers = {}
+        if email:
+            headers['Authorization'] = 'Basic ' + base64.b64encode(
+                ('%s:%s' % (email, password)).encode('utf-8')).decode('ascii')
+        samples = []
+        lock = threading.Lock()
+
+        def worker(urls):
+            client = self._client(email, password)
+            for url in urls:
+                counter.reset()
+                start = time.time()
+                response = client.get(url, base_url='https://localhost',
+                                      headers=headers)
+                elapsed = time.time() - start
+                statements, rows, objects = counter.read()
+                with lock:
+                    samples.append((elapsed, response.status_code, statements, rows,
+                                    objects))
+                db.session.remove()
+
+        threads = [threading.Thread(target=worker, args=(urls[i::self.concurrency],))
+                   for i in range(self.concurrency)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.time() - start
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        statuses = {}
+        for sample in samples:
+            statuses[str(sample[1])] = statuses.get(str(sample[1]), 0) + 1
+        count = len(samples) or 1
+        return {
+            'requests': len(samples),
+            'concurrency': self.concurrency,
+            'throughput': len(samples) / wall if wall else None,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else None,
+            'statements_per_request': sum(s[2] for s in samples) / float(count),
+            'rows_per_request': sum(s[3] for s in samples) / float(count),
+            'objects_per_request': sum(s[4] for s in samples) / float(count),
+            'statuses': statuses,
+        }
+
+    def run(self, password):
+        question_ids, usernames, email = self._targets()
+        results = {}
+        with QueryCounter(db.get_engine(self.app)) as counter:
+            for route in self.routes:
+                results[route] = self._run_route(route, question_ids, usernames,
+                                                 email, password, counter)
+        return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'anonymous': self.anonymous,
+                'routes': results}
+
+
+def benchmark_serializers(app, per_page=100, repeat=20):
+    """Time one API page of questions through ``to_json`` and the projection path.
+
+    Every repetition runs in a fresh request context and session, so URL
+    templates are rebuilt and nothing is served from the identity map.
+    """
+    from flask import jsonify
+    from .api_0_1.serializers import question_query, questions_json, json_response
+    order = (Question.timestamp.desc(), Question.id.desc())
+
+    def orm():
+        questions = Question.query.order_by(*order).limit(per_page)
+        return jsonify({'questions': [question.to_json() for question in questions]})
+
+    def projection(expand=()):
+        rows = question_query().order_by(*order).limit(per_page).all()
+        return json_response({'questions': questions_json(rows, expand)})
+
+    variants = (('to_json', orm),
+                ('projection', projection),
+                ('projection+expand', lambda: projection(('author', 'top_answers'))))
+    results = {}
+    with app.app_context(), QueryCounter(db.get_engine(app)) as counter:
+        for name, serialize in variants:
+            timings = []
+            for _ in range(repeat):
+                with app.test_request_context(base_url='https://localhost'):
+                    counter.reset()
+                    start = time.time()
+                    response = serialize()
+                    timings.append((time.time() - start) * 1000)
+                    statements, rows, objects = counter.read()
+                db.session.remove()
+            timings.sort()
+            results[name] = {'p50_ms': percentile(timings, 50),
+                             'p95_ms': percentile(timings, 95),
+                             'statements': statements,
+                             'rows': rows,
+                             'objects': objects,
+                             'bytes': len(response.get_data())}
+    return results
+
+
+def compare(results, baseline):
+    """Yield (route, metric, baseline, current, change) for shared metrics."""
+    for route, current in sorted(results['routes'].items()):
+        previous = baseline.get('routes', {}).get(route)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput',
+                       'statements_per_request', 'rows_per_request',
+                       'objects_per_request'):
+            old, new = previous.get(metric), current.get(metric)
+            if old and new is not None:
+                yield route, metric, old, new, (new - old) / float(old)
+
+
+def write_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
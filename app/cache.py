@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class TTLCache(LRUCache):
+    """LRUCache whose entries also expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize, ttl):
+        super(TTLCache, self).__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = super(TTLCache, self).get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires <= time.time():
+            self.delete(key)
+            self.hits -= 1
+            self.misses += 1
+            return None
+        return value
+
+    def set(self, key, value):
+        super(TTLCache, self).set(key, (value, time.time() + self.ttl))
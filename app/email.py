@@ -1,12 +1,155 @@
-from threading import Thread
+import atexit
+import smtplib
+import socket
+import time
+import weakref
+from threading import Thread, Lock
+try:
+    from Queue import Queue, Empty, Full
+except ImportError:
+    from queue import Queue, Empty, Full
 from flask_mail import Message
 from . import mail
 from flask import render_template, current_app
 
+_STOP = object()
 
-def send_async_email(app, msg):
-    with app.app_context():
-            mail.send(msg)
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, socket.error)
+
+_pools = weakref.WeakSet()
+
+
+def _is_transient(error):
+    """Whether a failed delivery is worth retrying: 4xx replies and lost connections."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in list(_pools):
+        pool.shutdown()
+
+
+class MailWorkerPool(object):
+    """A fixed number of delivery threads fed by a bounded queue.
+
+    Each worker keeps one SMTP connection open while there is work, sends
+    up to FLASK_MAIL_BATCH_SIZE queued messages per wakeup, reconnects and
+    retries on transient failures, logs and skips messages that fail for
+    any other reason and closes the connection after
+    FLASK_MAIL_IDLE_TIMEOUT idle seconds. When the queue is full, ``put``
+    blocks for up to FLASK_MAIL_QUEUE_TIMEOUT seconds before giving up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.queue = Queue(config['FLASK_MAIL_QUEUE_SIZE'])
+        self.workers = []
+        self.worker_count = config['FLASK_MAIL_WORKERS']
+        self.batch_size = config['FLASK_MAIL_BATCH_SIZE']
+        self.idle_timeout = config['FLASK_MAIL_IDLE_TIMEOUT']
+        self.put_timeout = config['FLASK_MAIL_QUEUE_TIMEOUT']
+        self.retries = config['FLASK_MAIL_RETRIES']
+        self._lock = Lock()
+
+    def start(self):
+        with self._lock:
+            if self.workers:
+                return
+            for i in range(self.worker_count):
+                worker = Thread(target=self._run, name='mail-worker-%d' % i)
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+
+    def put(self, msg):
+        self.start()
+        try:
+            self.queue.put(msg, timeout=self.put_timeout)
+        except Full:
+            self.app.logger.error('Mail queue full, dropping mail to %s' % msg.recipients)
+            return False
+        return True
+
+    def shutdown(self):
+        """Deliver everything already queued, then stop the workers."""
+        with self._lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            self.queue.put(_STOP)
+        for worker in workers:
+            worker.join()
+
+    def _run(self):
+        with self.app.app_context():
+            connection = None
+            while True:
+                try:
+                    msg = self.queue.get(timeout=self.idle_timeout)
+                except Empty:
+                    connection = self._close(connection)
+                    continue
+                batch = [msg]
+                while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except Empty:
+                        break
+                for msg in batch:
+                    if msg is not _STOP:
+                        connection = self._deliver(connection, msg)
+                    self.queue.task_done()
+                if batch[-1] is _STOP:
+                    self._close(connection)
+                    return
+
+    def _deliver(self, connection, msg):
+        for attempt in range(self.retries + 1):
+            try:
+                if connection is None:
+                    connection = mail.connect().__enter__()
+                connection.send(msg)
+                return connection
+            except Exception as e:
+                connection = self._close(connection)
+                if not _is_transient(e):
+                    self.app.logger.exception('Dropping mail to %s' % msg.recipients)
+                    return connection
+                if attempt < self.retries:
+                    time.sleep(0.5 * 2 ** attempt)
+        self.app.logger.error('Giving up on mail to %s' % msg.recipients)
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass
+        return None
+
+
+class MailQueue(object):
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # one atexit hook for every pool, so test apps are not kept alive
+        pool = app.extensions['mail_queue'] = MailWorkerPool(app)
+        _pools.add(pool)
+
+    def send(self, msg):
+        return current_app.extensions['mail_queue'].put(msg)
+
+
+mail_queue = MailQueue()
 
 
 def send_mail(to, subject, template, **kwargs):
@@ -15,6 +158,4 @@ def send_mail(to, subject, template, **kwargs):
                   recipients=[to])
     msg.body = render_template(template + '.txt', **kwargs)
     msg.html = render_template(template + '.html', **kwargs)
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
\ No newline at end of file
+    return mail_queue.send(msg)
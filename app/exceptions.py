@@ -1,2 +1,6 @@
 class ValidationError(ValueError):
-    pass
\ No newline at end of file
+    pass
+
+
+class NPlusOneError(RuntimeError):
+    pass
@@ -0,0 +1,81 @@
+import json
+from collections import OrderedDict
+from datetime import datetime
+from . import db
+from .exceptions import ValidationError
+from .models import Question, Answer, Vote, Follow
+
+# entity: (model, exported columns, sort columns); the sort columns follow the
+# primary key so the scan needs no sort step and ``since_id`` is a range seek
+EXPORTS = {
+    'questions': (Question, ('id', 'title', 'body', 'timestamp', 'author_id'), ('id',)),
+    'answers': (Answer, ('id', 'question_id', 'author_id', 'body', 'timestamp',
+                         'vote_count'), ('id',)),
+    'votes': (Vote, ('id', 'answer_id', 'author_id', 'timestamp'), ('id',)),
+    'follows': (Follow, ('follower_id', 'followed_id', 'timestamp'),
+                ('follower_id', 'followed_id')),
+}
+
+SINCE_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d')
+
+
+def parse_since(value):
+    if not value:
+        return None
+    for format in SINCE_FORMATS:
+        try:
+            return datetime.strptime(value, format)
+        except ValueError:
+            pass
+    raise ValidationError('since must be an ISO 8601 timestamp')
+
+
+def _after(columns, values):
+    """Rows sorting after ``values`` on ``columns``, as a keyset predicate."""
+    return db.or_(*[db.and_(*[column == value for column, value
+                              in zip(columns[:i], values[:i])] + [columns[i] > values[i]])
+                    for i in range(len(columns))])
+
+
+def export_rows(entity, since=None, since_id=None, chunk_size=1000):
+    """Iterate over the rows of ``entity`` as dicts, oldest first.
+
+    Rows are read as plain column tuples in keyset pages of ``chunk_size``:
+    each page is one short query that resumes after the last key of the
+    previous one, so no cursor stays open (and no read lock is held) while
+    a slow client drains the response, and memory use does not grow with
+    the table. ``since`` keeps rows stamped after that time and
+    ``since_id`` rows after that id, which is what an incremental pull
+    passes back from its last line.
+    """
+    model, columns, order = EXPORTS[entity]
+    query = db.session.query(*[getattr(model, name) for name in columns])
+    if since is not None:
+        query = query.filter(model.timestamp > since)
+    if since_id is not None:
+        if order != ('id',):
+            raise ValidationError('%s cannot be exported since an id' % entity)
+        query = query.filter(model.id > since_id)
+    order_columns = [getattr(model, name) for name in order]
+    key = [columns.index(name) for name in order]
+    query = query.order_by(*order_columns)
+    page = query
+    while True:
+        rows = page.limit(chunk_size).all()
+        for row in rows:
+            yield OrderedDict(zip(columns, row))
+        if len(rows) < chunk_size:
+            return
+        page = query.filter(_after(order_columns, [rows[-1][i] for i in key]))
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def ndjson(rows):
+    """Encode dicts as newline-delimited JSON, one line per row."""
+    for row in rows:
+        yield json.dumps(row, default=_default, separators=(',', ':')) + '\n'
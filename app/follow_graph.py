@@ -0,0 +1,184 @@
+import heapq
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock, Thread
+from flask import current_app
+from flask_sqlalchemy import models_committed
+
+_EMPTY = array('l')
+
+
+def _contains(ids, value):
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def _remove(ids, value):
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+
+
+class _Graph(object):
+    def __init__(self):
+        self.following = {}
+        self.followers = {}
+        self.loaded_at = 0
+
+    def has(self, follower_id, followed_id):
+        return _contains(self.following.get(follower_id, _EMPTY), followed_id)
+
+    def apply(self, operation, follower_id, followed_id):
+        if operation == 'insert':
+            self.add(follower_id, followed_id)
+        elif operation == 'delete':
+            self.remove(follower_id, followed_id)
+
+    def add(self, follower_id, followed_id):
+        if self.has(follower_id, followed_id):
+            return
+        insort(self.following.setdefault(follower_id, array('l')), followed_id)
+        insort(self.followers.setdefault(followed_id, array('l')), follower_id)
+
+    def remove(self, follower_id, followed_id):
+        if not self.has(follower_id, followed_id):
+            return
+        _remove(self.following[follower_id], followed_id)
+        _remove(self.followers.get(followed_id, array('l')), follower_id)
+
+
+class FollowGraph(object):
+    """Per-process copy of the ``follows`` table.
+
+    Edges are kept as sorted ``array('l')`` adjacency lists in both
+    directions; membership tests bisect the follower's list. The graph is
+    loaded with one query on first use, kept in sync with follows committed
+    by this process and reloaded every FLASK_FOLLOW_GRAPH_TTL seconds to
+    pick up other processes' changes. The reload runs on a background
+    thread while requests keep reading the previous copy; follows committed
+    while it runs are recorded and replayed on the new copy before it is
+    swapped in, so they are not lost if its query missed them.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['follow_graph'] = {'graph': None, 'lock': Lock(),
+                                         'reloader': None, 'replays': []}
+        models_committed.connect(self._on_models_committed, sender=app)
+
+    def _state(self, app=None):
+        return (app or current_app).extensions['follow_graph']
+
+    def load(self, app=None):
+        from . import db
+        from .models import Follow
+        app = app or current_app._get_current_object()
+        state = self._state(app)
+        replay = []
+        with state['lock']:
+            state['replays'].append(replay)
+        try:
+            graph = self._read(db, Follow)
+        except Exception:
+            with state['lock']:
+                state['replays'].remove(replay)
+            raise
+        with state['lock']:
+            state['replays'].remove(replay)
+            for change in replay:
+                graph.apply(*change)
+            state['graph'] = graph
+        return graph
+
+    def _read(self, db, Follow):
+        graph = _Graph()
+        rows = db.session.query(Follow.follower_id, Follow.followed_id)\
+            .order_by(Follow.follower_id, Follow.followed_id)
+        for follower_id, followed_id in rows.yield_per(10000):
+            graph.following.setdefault(follower_id, array('l')).append(followed_id)
+            graph.followers.setdefault(followed_id, array('l')).append(follower_id)
+        for ids in graph.followers.values():
+            ids[:] = array('l', sorted(ids))
+        graph.loaded_at = time.time()
+        return graph
+
+    def graph(self):
+        state = self._state()
+        graph = state['graph']
+        if graph is None:
+            return self.load()
+        if time.time() - graph.loaded_at > current_app.config['FLASK_FOLLOW_GRAPH_TTL']:
+            self._reload(state)
+        return graph
+
+    def _reload(self, state):
+        with state['lock']:
+            if state['reloader'] is not None:
+                return
+            state['reloader'] = Thread(target=self._run_reload,
+                                       args=(current_app._get_current_object(), state),
+                                       name='follow-graph-reload')
+            state['reloader'].daemon = True
+        state['reloader'].start()
+
+    def _run_reload(self, app, state):
+        try:
+            with app.app_context():
+                self.load(app)
+        except Exception:
+            app.logger.exception('Reloading the follow graph failed')
+        finally:
+            with state['lock']:
+                state['reloader'] = None
+
+    def _on_models_committed(self, app, changes):
+        state = self._state(app)
+        with state['lock']:
+            graph = state['graph']
+            for model, operation in changes:
+                if type(model).__name__ != 'Follow':
+                    continue
+                change = (operation, model.follower_id, model.followed_id)
+                if graph is not None:
+                    graph.apply(*change)
+                for replay in state['replays']:
+                    replay.append(change)
+
+    def is_following(self, follower_id, followed_id):
+        return self.graph().has(follower_id, followed_id)
+
+    def following(self, user_id):
+        """Sorted ids of the users ``user_id`` follows, itself included."""
+        return self.graph().following.get(user_id, _EMPTY)
+
+    def followers(self, user_id):
+        """Sorted ids of the users following ``user_id``, itself included."""
+        return self.graph().followers.get(user_id, _EMPTY)
+
+    def suggestions(self, user_id, limit=10):
+        """Friends of friends as (user_id, mutual count), most mutual first.
+
+        Walks at most FLASK_FOLLOW_SUGGESTION_BUDGET second-hop edges,
+        starting from the followees with the smallest lists, so users who
+        follow thousands of people still get a bounded amount of work.
+        """
+        graph = self.graph()
+        budget = current_app.config['FLASK_FOLLOW_SUGGESTION_BUDGET']
+        followed = graph.following.get(user_id, _EMPTY)
+        hops = sorted((graph.following.get(friend_id, _EMPTY) for friend_id in followed
+                       if friend_id != user_id), key=len)
+        counts = Counter()
+        for ids in hops:
+            if budget <= 0:
+                break
+            counts.update(ids[:budget])
+            budget -= len(ids)
+        counts.pop(user_id, None)
+        for friend_id in followed:
+            counts.pop(friend_id, None)
+        return heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,46 @@
+from flask import current_app, render_template
+from jinja2 import Markup, Undefined
+from .cache import LRUCache
+
+CONTROLS = Markup('<!--controls-->')
+
+
+class FragmentCache(object):
+    """Caches the viewer independent HTML of question cards and answers.
+
+    Fragments are keyed by template, entity id and entity ``version``; the
+    version column is bumped by model events whenever anything the fragment
+    shows changes. Viewer specific controls are rendered on every request
+    and spliced in where the template prints ``{{ controls }}``.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['fragment_cache'] = LRUCache(app.config['FLASK_FRAGMENT_CACHE_SIZE'])
+        app.add_template_global(self.render, 'render_fragment')
+
+    @property
+    def cache(self):
+        return current_app.extensions['fragment_cache']
+
+    @staticmethod
+    def key(template_name, context):
+        key = [template_name]
+        for name, value in sorted(context.items()):
+            if isinstance(value, Undefined):
+                value = None
+            elif hasattr(value, 'version'):
+                value = (value.__tablename__, value.id, value.version)
+            key.append((name, value))
+        return tuple(key)
+
+    def render(self, template_name, controls=u'', **context):
+        key = self.key(template_name, context)
+        html = self.cache.get(key)
+        if html is None:
+            html = render_template(template_name, controls=CONTROLS, **context)
+            self.cache.set(key, html)
+        return Markup(html.replace(CONTROLS, controls, 1))
@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import time
+from threading import Lock
+from flask import current_app
+from flask_sqlalchemy import models_committed
+from sqlalchemy.orm import make_transient_to_detached
+from .cache import LRUCache, TTLCache
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+class _IdentityState(object):
+    def __init__(self, maxsize, ttl):
+        self.users = TTLCache(maxsize, ttl)
+        self.ttl = ttl
+        self.lock = Lock()
+        self.roles = None
+        self.roles_expire = 0
+
+
+class IdentityCache(object):
+    """Per-process cache of session users and role permissions.
+
+    load_user keeps the column values of recently seen users for
+    FLASK_USER_CACHE_TTL seconds and re-attaches them to the request's
+    session without a SELECT. The few role rows are held in memory as an
+    id -> permission map so permission checks never lazy-load ``User.role``.
+    Commits touching a user or a role invalidate the matching entries.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['identity_cache'] = _IdentityState(
+            app.config['FLASK_USER_CACHE_SIZE'], app.config['FLASK_USER_CACHE_TTL'])
+        models_committed.connect(self._on_models_committed, sender=app)
+
+    @property
+    def state(self):
+        return current_app.extensions['identity_cache']
+
+    def _on_models_committed(self, app, changes):
+        state = app.extensions['identity_cache']
+        for model, operation in changes:
+            name = type(model).__name__
+            if name == 'User':
+                state.users.delete(model.id)
+            elif name == 'Role':
+                state.roles = None
+
+    def load_user(self, user_id):
+        from . import db
+        from .models import User
+        user_id = int(user_id)
+        attrs = self.state.users.get(user_id)
+        if attrs is None:
+            user = User.query.get(user_id)
+            if user is not None:
+                self.state.users.set(user_id, dict(
+                    (prop.key, getattr(user, prop.key))
+                    for prop in User.__mapper__.column_attrs))
+            return user
+        user = User.__mapper__.class_manager.new_instance()
+        for key, value in attrs.items():
+            setattr(user, key, value)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def permission(self, role_id):
+        from .models import Role
+        state = self.state
+        roles = state.roles
+        if roles is None or state.roles_expire <= time.time():
+            roles = dict(Role.query.with_entities(Role.id, Role.permission))
+            with state.lock:
+                state.roles = roles
+                state.roles_expire = time.time() + state.ttl
+        return roles.get(role_id)
+
+
+class CredentialCache(object):
+    """Remembers API credentials that already passed verification.
+
+    Entries are keyed by an HMAC of the credential, so neither passwords
+    nor tokens are held in memory, and map to the user id, the password
+    hash current at verification time and an expiry: the token's own
+    expiry, or FLASK_CREDENTIAL_CACHE_TTL seconds for email and password.
+    A hit is only honoured while the user's password hash is unchanged,
+    which drops every cached credential on password change or reset, and,
+    for email and password, while the user still has that email.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['credential_cache'] = LRUCache(app.config['FLASK_CREDENTIAL_CACHE_SIZE'])
+
+    @property
+    def cache(self):
+        return current_app.extensions['credential_cache']
+
+    @staticmethod
+    def key(credential, password):
+        message = _to_bytes(credential) + b'\0' + _to_bytes(password)
+        return hmac.new(_to_bytes(current_app.config['SECRET_KEY']),
+                        message, hashlib.sha256).hexdigest()
+
+    def get(self, credential, password):
+        key = self.key(credential, password)
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        user_id, password_hash, expires, token_used = entry
+        if expires <= time.time():
+            self.cache.delete(key)
+            return None
+        from . import identity_cache
+        user = identity_cache.load_user(user_id)
+        if user is None or user.password_hash != password_hash or \
+                (not token_used and user.email != credential):
+            self.cache.delete(key)
+            return None
+        return user, token_used
+
+    def set(self, credential, password, user, expires, token_used):
+        self.cache.set(self.key(credential, password),
+                       (user.id, user.password_hash, expires, token_used))
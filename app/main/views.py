@@ -3,10 +3,12 @@
 from flask import render_template,redirect, url_for, abort, flash, request, current_app, make_response
 from . import main
 from .forms import EditProfileForm, EditProfileAdminForm, QuestionForm, AnswerForm
-from .. import db
-from ..models import User, Role, Permission, Question, Comment, Answer, Vote
+from .. import db, page_cache, metrics, search_index, vote_buffer
+from ..models import User, Role, Permission, Question, Comment, Answer, Vote, Follow, \
+    Timeline
 from flask_login import login_required, current_user
 from ..decorators import admin_required, permission_required
+from ..pagination import paginate, KeysetPagination
 from flask_sqlalchemy import  get_debug_queries
 import sys
 
@@ -19,38 +21,46 @@ import sys
 
 
 @main.route('/', methods=['GET', 'POST'])
+@page_cache.cached
 def index():
-    query_questions = None
-    if current_user.is_authenticated:
-        query_questions = current_user.followed_questions
-        if query_questions.count() <= 0:
-            query_questions = Question.query
+    if current_user.is_authenticated and current_user.has_followed_questions():
+        pagination_questions = paginate(
+            current_user.followed_questions.options(db.joinedload(Question.author)),
+            Timeline.timestamp, Timeline.question_id, per_page=20,
+            key=lambda question: (question.timestamp, question.id))
     else:
-        query_questions = Question.query
-    page = request.args.get('page', 1, type=int)
-    pagination_questions = query_questions.order_by(Question.timestamp.desc()).paginate(
-        page, per_page=20, error_out=False)
+        pagination_questions = paginate(
+            Question.query.options(db.joinedload(Question.author)),
+            Question.timestamp, Question.id, per_page=20)
     questions = pagination_questions.items
+    top_answers = Question.load_top_answers([q.id for q in questions], 2)
+    answer_counts = Question.answer_counts([q.id for q in questions])
     return render_template('index.html', questions=questions,
                            pagination_questions=pagination_questions,
+                           top_answers=top_answers, answer_counts=answer_counts,
                            Answer=Answer, row=2)
 
 
 @main.route('/user/<username>')
 def user(username):
-    user = User.query.filter_by(username=username).first()
+    user = User.query.options(db.joinedload(User.stats))\
+        .filter_by(username=username).first()
     if user is None:
         abort(404)
-    page = request.args.get('page', 1, type=int)
-    pagination_questions = user.questions.order_by(Question.timestamp.desc()).paginate(
-        page, per_page=20, error_out=False)
-    pagination_answers = user.answers.order_by(Answer.timestamp.desc()).paginate(
-        page, per_page=20, error_out=False)
+    pagination_questions = paginate(user.questions, Question.timestamp,
+                                    Question.id, per_page=20)
+    pagination_answers = paginate(user.answers.options(db.joinedload(Answer.author)),
+                                  Answer.timestamp, Answer.id, per_page=20,
+                                  cursor_arg='answers_cursor')
     questions = pagination_questions.items
     answers = pagination_answers.items
+    top_answers = Question.load_top_answers([q.id for q in questions], 0)
+    answer_counts = Question.answer_counts([q.id for q in questions])
     admin = User.query.filter_by(email=current_app.config['FLASK_MAIL_ADMIN']).first()
     return render_template('user.html', user=user, questions=questions,
-                           admin=admin, answers=answers, Answer=Answer, row=0,
+                           admin=admin, answers=answers, top_answers=top_answers,
+                           answer_counts=answer_counts,
+                           Answer=Answer, row=0,
                            pagination_answers=pagination_answers,
                            pagination_questions=pagination_questions)
 
@@ -117,9 +127,11 @@ def question(id):
     pagination = Answer.query.filter_by(question_id=id).paginate(
         page, per_page=current_app.config['FLASK_ANSWERS_PER_PAGE'],
         error_out=False)
+    top_answers = Question.load_top_answers([question.id], sys.maxint)
     return render_template('question.html', questions=[question], form=form,
-                           pagination=pagination, row=sys.maxint,
-                           Answer=Answer, body=True)
+                           pagination=pagination, top_answers=top_answers,
+                           answer_counts={question.id: pagination.total},
+                           row=sys.maxint, Answer=Answer, body=True)
 
 
 @main.route('/edit_question/<int:id>', methods=['GET', 'POST'])
@@ -198,10 +210,9 @@ def followers(username):
     if user is None:
         flash('Invalid user!')
         return redirect(url_for('.index'))
-    page = request.args.get('page', 1, type=int)
-    pagination = user.followers.paginate(
-        page, per_page=current_app.config['FLASK_FOLLOWERS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(
+        user.followers, Follow.timestamp, Follow.follower_id,
+        per_page=current_app.config['FLASK_FOLLOWERS_PER_PAGE'])
     follows = [{'user': item.follower, 'timestamp': item.timestamp}
                for item in pagination.items]
     return render_template('followers.html', user=user, title="Followers of",
@@ -215,10 +226,9 @@ def followed_by(username):
     if user is None:
         flash(u'用户不存在!')
         return redirect(url_for('.index'))
-    page = request.args.get('page', 1, type=int)
-    pagination = user.followed.paginate(
-        page, per_page=current_app.config['FLASK_FOLLOWERS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate(
+        user.followed, Follow.timestamp, Follow.followed_id,
+        per_page=current_app.config['FLASK_FOLLOWERS_PER_PAGE'])
     follows = [{'user': item.followed, 'timestamp': item.timestamp}
                for item in pagination.items]
     return render_template('followers.html', user=user, title="Followed by",
@@ -247,13 +257,14 @@ def followed_by(username):
 @login_required
 @permission_required(Permission.MODERATE_COMMENTS)
 def moderate():
-    page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASK_COMMENTS_PER_PAGE'],
-        error_out=False)
+    page = request.args.get('page', type=int)
+    cursor = request.args.get('cursor')
+    pagination = paginate(
+        Comment.query, Comment.timestamp, Comment.id,
+        per_page=current_app.config['FLASK_COMMENTS_PER_PAGE'])
     comments = pagination.items
     return render_template('moderate.html', comments=comments,
-                           pagination=pagination, page=page)
+                           pagination=pagination, page=page, cursor=cursor)
 
 
 @main.route('/moderate/enable/<int:id>')
@@ -264,7 +275,8 @@ def moderate_enable(id):
     comment.disabled = False
     db.session.add(comment)
     db.session.commit()
-    return redirect(url_for('.moderate', page=request.args.get('page', 1, type=int)))
+    return redirect(url_for('.moderate', page=request.args.get('page', type=int),
+                            cursor=request.args.get('cursor')))
 
 
 @main.route('/moderate/disable/<int:id>')
@@ -275,31 +287,74 @@ def moderate_disable(id):
     comment.disabled = True
     db.session.add(comment)
     db.session.commit()
-    return redirect(url_for('.moderate', page=request.args.get('page', 1, type=int)))
+    return redirect(url_for('.moderate', page=request.args.get('page', type=int),
+                            cursor=request.args.get('cursor')))
 
 
 @main.after_app_request
 def after_request(response):
-    for query in get_debug_queries():
+    queries = get_debug_queries()
+    sql_time = 0.0
+    for query in queries:
+        sql_time += query.duration
         if query.duration >= current_app.config['FLASK_SLOW_DB_QUERY_TIME']:
             current_app.logger.warning(
                 'Slow query: %s\nParameters: %s\nDuration: %f\nContext: %s\n' % \
                 (query.statement, query.parameters, query.duration, query.context))
+    metrics.record_request(request.endpoint, response.status_code, len(queries), sql_time)
+    return response
+
+
+@main.route('/metrics')
+@login_required
+@admin_required
+def metrics_view():
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
     return response
 
 
 @main.route('/square')
+@page_cache.cached
 def square():
     query_questions = Question.query
-    page = request.args.get('page', 1, type=int)
-    pagination_questions = query_questions.order_by(Question.timestamp.desc()).paginate(
-        page, per_page=20, error_out=False)
+    pagination_questions = paginate(
+        query_questions.options(db.joinedload(Question.author)),
+        Question.timestamp, Question.id, per_page=20)
     questions = pagination_questions.items
+    top_answers = Question.load_top_answers([q.id for q in questions], 2)
+    answer_counts = Question.answer_counts([q.id for q in questions])
     return render_template('square.html', questions=questions,
                            pagination_questions=pagination_questions,
+                           top_answers=top_answers, answer_counts=answer_counts,
+                           Answer=Answer, row=2)
+
+
+@main.route('/trending')
+@page_cache.cached
+def trending():
+    pagination_questions = KeysetPagination(
+        Question.query.options(db.joinedload(Question.author)),
+        Question.hot_score, Question.id, request.args.get('cursor'),
+        current_app.config['FLASK_TRENDING_PER_PAGE'])
+    questions = pagination_questions.items
+    top_answers = Question.load_top_answers([q.id for q in questions], 2)
+    answer_counts = Question.answer_counts([q.id for q in questions])
+    return render_template('trending.html', questions=questions,
+                           pagination_questions=pagination_questions,
+                           top_answers=top_answers, answer_counts=answer_counts,
                            Answer=Answer, row=2)
 
 
+@main.route('/search')
+def search():
+    q = request.args.get('q', u'').strip()
+    page = request.args.get('page', 1, type=int)
+    pagination = search_index.search(q, page)
+    return render_template('search.html', q=q, results=pagination.items,
+                           pagination=pagination)
+
+
 @main.route('/post_question', methods=['GET', 'POST'])
 @login_required
 @permission_required(Permission.WRITE_ARTICLES)
@@ -318,14 +373,7 @@ def post_question():
 @main.route('/vote/<int:id>')
 @login_required
 def vote(id):
-    answer = Answer.query.get_or_404(id)
-    if Vote.query.filter_by(answer=answer,
-                            author=current_user._get_current_object()).first():
+    if not vote_buffer.add(current_user.id, id):
         flash(u'您已经点赞过这个问答了。')
-        return redirect(request.args.get('next') or url_for('.index'))
-    vote = Vote(answer=answer,
-                author=current_user._get_current_object())
-    db.session.add(vote)
-    db.session.commit()
     return redirect(request.args.get('next') or url_for('.index'))
 
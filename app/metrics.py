@@ -0,0 +1,226 @@
+import bisect
+import threading
+import time
+from flask import current_app, g, before_render_template, template_rendered
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _EndpointStats(object):
+    __slots__ = ('buckets', 'count', 'duration', 'sql_count', 'sql_time',
+                 'render_time', 'statuses')
+
+    def __init__(self, bucket_count):
+        self.buckets = [0] * (bucket_count + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.statuses = {}
+
+
+def _add(totals, shard, bucket_count):
+    for endpoint, stats in list(shard.items()):
+        total = totals.get(endpoint)
+        if total is None:
+            total = totals[endpoint] = _EndpointStats(bucket_count)
+        for i, n in enumerate(stats.buckets):
+            total.buckets[i] += n
+        total.count += stats.count
+        total.duration += stats.duration
+        total.sql_count += stats.sql_count
+        total.sql_time += stats.sql_time
+        total.render_time += stats.render_time
+        for status, n in list(stats.statuses.items()):
+            total.statuses[status] = total.statuses.get(status, 0) + n
+
+
+class _Registry(object):
+    """Per-thread shards of endpoint statistics.
+
+    Each thread only ever writes to its own shard, so recording a request
+    takes no lock; the shard list is locked only when a new thread shows up
+    and when an export has to walk it. Shards of threads that have exited
+    are folded into one retired total, so thread-per-request servers do not
+    grow the list without bound.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._retire_at = 64
+        self._lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._retire_at:
+                    self._retire()
+                    self._retire_at = max(64, 2 * len(self._shards))
+        return shard
+
+    def _retire(self):
+        """Fold the shards of dead threads into the retired total; needs the lock."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _add(self._retired, shard, len(self.buckets))
+        self._shards = live
+
+    def record(self, endpoint, status, duration, sql_count, sql_time, render_time):
+        shard = self.shard()
+        stats = shard.get(endpoint)
+        if stats is None:
+            stats = shard[endpoint] = _EndpointStats(len(self.buckets))
+        stats.buckets[bisect.bisect_left(self.buckets, duration)] += 1
+        stats.count += 1
+        stats.duration += duration
+        stats.sql_count += sql_count
+        stats.sql_time += sql_time
+        stats.render_time += render_time
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def merged(self):
+        merged = {}
+        with self._lock:
+            self._retire()
+            _add(merged, self._retired, len(self.buckets))
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _add(merged, shard, len(self.buckets))
+        return merged
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+    """Per endpoint request, SQL, template and cache metrics.
+
+    Request latency and template render time are measured here; SQL count
+    and time are fed in by the slow query hook in ``main.after_request``,
+    which already walks ``get_debug_queries()`` for every request. The
+    result is exported in the Prometheus text format by ``render``.
+    """
+
+    # app.extensions key -> name of the cache in the exported metrics
+    caches = (('page_cache', 'page'), ('fragment_cache', 'fragment'),
+              ('identity_cache', 'user'), ('credential_cache', 'credential'))
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = _Registry(
+            app.config.get('FLASK_METRICS_BUCKETS', DEFAULT_BUCKETS))
+        app.before_request(self._before_request)
+        before_render_template.connect(self._before_render, sender=app)
+        template_rendered.connect(self._after_render, sender=app)
+
+    @staticmethod
+    def _before_request():
+        g.metrics_start = time.time()
+        g.metrics_render_depth = 0
+        g.metrics_render_time = 0.0
+
+    @staticmethod
+    def _before_render(app, template, context, **extra):
+        depth = getattr(g, 'metrics_render_depth', 0)
+        if depth == 0:
+            g.metrics_render_start = time.time()
+        g.metrics_render_depth = depth + 1
+
+    @staticmethod
+    def _after_render(app, template, context, **extra):
+        depth = getattr(g, 'metrics_render_depth', 0) - 1
+        if depth < 0:
+            return
+        g.metrics_render_depth = depth
+        if depth == 0:
+            g.metrics_render_time = getattr(g, 'metrics_render_time', 0.0) + \
+                time.time() - g.metrics_render_start
+
+    def record_request(self, endpoint, status, sql_count, sql_time):
+        start = getattr(g, 'metrics_start', None)
+        if start is None:
+            return
+        current_app.extensions['metrics'].record(
+            endpoint or 'none', status, time.time() - start, sql_count, sql_time,
+            getattr(g, 'metrics_render_time', 0.0))
+
+    def _cache_counters(self, app):
+        from .rendering import render_cache
+        found = [('render', render_cache)]
+        for key, name in self.caches:
+            cache = app.extensions.get(key)
+            for attr in ('pages', 'users'):
+                cache = getattr(cache, attr, cache)
+            if hasattr(cache, 'hits'):
+                found.append((name, cache))
+        return found
+
+    def render(self, app=None):
+        app = app or current_app._get_current_object()
+        registry = app.extensions['metrics']
+        stats = sorted(registry.merged().items())
+        lines = []
+
+        def family(name, kind, doc):
+            lines.append('# HELP %s %s' % (name, doc))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        family('flask_request_duration_seconds', 'histogram',
+               'Request latency by endpoint.')
+        for endpoint, s in stats:
+            label = 'endpoint="%s"' % _label(endpoint)
+            cumulative = 0
+            for bound, n in zip(registry.buckets, s.buckets):
+                cumulative += n
+                lines.append('flask_request_duration_seconds_bucket{%s,le="%r"} %d'
+                             % (label, bound, cumulative))
+            lines.append('flask_request_duration_seconds_bucket{%s,le="+Inf"} %d'
+                         % (label, s.count))
+            lines.append('flask_request_duration_seconds_sum{%s} %r' % (label, s.duration))
+            lines.append('flask_request_duration_seconds_count{%s} %d' % (label, s.count))
+
+        family('flask_requests_total', 'counter', 'Requests by endpoint and status.')
+        for endpoint, s in stats:
+            for status, n in sorted(s.statuses.items()):
+                lines.append('flask_requests_total{endpoint="%s",status="%s"} %d'
+                             % (_label(endpoint), status, n))
+
+        for name, attr, kind, doc in (
+                ('flask_sql_queries_total', 'sql_count', '%d',
+                 'SQL statements executed by endpoint.'),
+                ('flask_sql_duration_seconds_total', 'sql_time', '%r',
+                 'Time spent in SQL by endpoint.'),
+                ('flask_template_render_seconds_total', 'render_time', '%r',
+                 'Time spent rendering templates by endpoint.')):
+            family(name, 'counter', doc)
+            for endpoint, s in stats:
+                lines.append(('%s{endpoint="%s"} ' + kind)
+                             % (name, _label(endpoint), getattr(s, attr)))
+
+        caches = self._cache_counters(app)
+        family('flask_cache_hits_total', 'counter', 'Cache hits.')
+        for name, cache in caches:
+            lines.append('flask_cache_hits_total{cache="%s"} %d' % (name, cache.hits))
+        family('flask_cache_misses_total', 'counter', 'Cache misses.')
+        for name, cache in caches:
+            lines.append('flask_cache_misses_total{cache="%s"} %d' % (name, cache.misses))
+        family('flask_cache_hit_ratio', 'gauge', 'Cache hits / lookups.')
+        for name, cache in caches:
+            lookups = cache.hits + cache.misses
+            lines.append('flask_cache_hit_ratio{cache="%s"} %r'
+                         % (name, float(cache.hits) / lookups if lookups else 0.0))
+        return '\n'.join(lines) + '\n'
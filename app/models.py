@@ -4,13 +4,20 @@ from flask_login import UserMixin, AnonymousUserMixin
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from flask import current_app
 from datetime import datetime
-from markdown import markdown
-import bleach
-from . import log_manager
+from collections import Counter
+from sqlalchemy.exc import IntegrityError
+from .rendering import BodyRenderer
+from . import log_manager, last_seen_buffer, identity_cache, search_index, follow_graph, \
+    page_cache, vote_buffer
 from flask import url_for
 from app.exceptions import ValidationError
 
 
+def touched(table):
+    """UPDATE values that mark rows of ``table`` as changed for caches and ETags."""
+    return {'version': table.c.version + 1, 'updated_at': datetime.utcnow()}
+
+
 class Permission:
     FOLLOW = 0X01
     COMMENT = 0X02
@@ -23,7 +30,179 @@ class Follow(db.Model):
     __tablename__ = 'follows'
     follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_follows_followed_id_timestamp',
+                               followed_id, timestamp, follower_id),
+                      db.Index('ix_follows_follower_id_timestamp',
+                               follower_id, timestamp, followed_id))
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        questions = Question.__table__
+        backfill = db.select([db.literal(target.follower_id), questions.c.id,
+                              questions.c.author_id, questions.c.timestamp])\
+            .where(questions.c.author_id == target.followed_id)
+        connection.execute(Timeline.__table__.insert().from_select(
+            ['user_id', 'question_id', 'author_id', 'timestamp'], backfill))
+        if target.follower_id != target.followed_id:
+            UserStats.bump(connection, target.follower_id, followed_count=1)
+            UserStats.bump(connection, target.followed_id, follower_count=1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        timelines = Timeline.__table__
+        connection.execute(timelines.delete()
+                           .where(timelines.c.user_id == target.follower_id)
+                           .where(timelines.c.author_id == target.followed_id))
+        if target.follower_id != target.followed_id:
+            UserStats.bump(connection, target.follower_id, followed_count=-1)
+            UserStats.bump(connection, target.followed_id, follower_count=-1)
+
+db.event.listen(Follow, 'after_insert', Follow.on_inserted)
+db.event.listen(Follow, 'after_delete', Follow.on_deleted)
+
+
+class Timeline(db.Model):
+    __tablename__ = 'timelines'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    timestamp = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_timelines_user_id_timestamp',
+                               user_id, timestamp, question_id),)
+
+    @staticmethod
+    def rebuild():
+        timelines = Timeline.__table__
+        questions = Question.__table__
+        follows = Follow.__table__
+        entries = db.select([follows.c.follower_id, questions.c.id,
+                             questions.c.author_id, questions.c.timestamp])\
+            .where(follows.c.followed_id == questions.c.author_id)
+        db.session.execute(timelines.delete())
+        db.session.execute(timelines.insert().from_select(
+            ['user_id', 'question_id', 'author_id', 'timestamp'], entries))
+        db.session.commit()
+
+
+class UserStats(db.Model):
+    """Per-user counters kept current by model events.
+
+    Self-follows are not counted. ``verify`` recomputes every counter from
+    the source tables and reports (or, with ``repair``, fixes) rows that
+    have drifted, e.g. after bulk imports that bypass the ORM.
+    """
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    question_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    answer_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    follower_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    followed_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    votes_received = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    counters = ('question_count', 'answer_count', 'follower_count',
+                'followed_count', 'votes_received')
+
+    user = db.relationship('User', backref=db.backref('stats', uselist=False,
+                                                      cascade='all, delete-orphan'))
+
+    @staticmethod
+    def bump(connection, user_id, **deltas):
+        if user_id is None:
+            return
+        table = UserStats.__table__
+        result = connection.execute(
+            table.update().where(table.c.user_id == user_id)
+            .values(**dict((name, table.c[name] + delta) for name, delta in deltas.items())))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(user_id=user_id, **deltas))
+
+    @staticmethod
+    def expected():
+        """Select of (user_id, counters...) recomputed from the source tables."""
+        users = User.__table__
+        questions = Question.__table__
+        answers = Answer.__table__
+        follows = Follow.__table__
+        votes = Vote.__table__
+
+        def count(column, *where):
+            return db.select([db.func.count()]).select_from(column.table)\
+                .where(db.and_(*where)).as_scalar()
+        return db.select([
+            users.c.id,
+            count(questions.c.id, questions.c.author_id == users.c.id),
+            count(answers.c.id, answers.c.author_id == users.c.id),
+            count(follows.c.follower_id, follows.c.followed_id == users.c.id,
+                  follows.c.follower_id != users.c.id),
+            count(follows.c.followed_id, follows.c.follower_id == users.c.id,
+                  follows.c.followed_id != users.c.id),
+            db.select([db.func.count()]).select_from(votes.join(answers, votes.c.answer_id == answers.c.id))
+            .where(answers.c.author_id == users.c.id).as_scalar()])
+
+    @staticmethod
+    def verify(repair=False, chunk_size=1000):
+        """Return [(user_id, counter, stored, expected)] for every mismatch."""
+        table = UserStats.__table__
+        stored = dict((row[0], tuple(row[1:])) for row in db.session.execute(
+            db.select([table.c.user_id] + [table.c[name] for name in UserStats.counters])))
+        mismatches, fixes = [], []
+        for row in db.session.execute(UserStats.expected()):
+            user_id, expected = row[0], tuple(row[1:])
+            current = stored.get(user_id)
+            if current == expected:
+                continue
+            for i, name in enumerate(UserStats.counters):
+                if current is None or current[i] != expected[i]:
+                    mismatches.append((user_id, name, current and current[i], expected[i]))
+            fixes.append((user_id, current is None, expected))
+        if repair and fixes:
+            update = table.update().where(table.c.user_id == db.bindparam('b_user_id'))\
+                .values(**dict((name, db.bindparam('b_' + name)) for name in UserStats.counters))
+            for i in range(0, len(fixes), chunk_size):
+                chunk = fixes[i:i + chunk_size]
+                missing = [dict(zip(('user_id',) + UserStats.counters, (user_id,) + values))
+                           for user_id, is_missing, values in chunk if is_missing]
+                present = [dict(zip(('b_user_id',) + tuple('b_' + n for n in UserStats.counters),
+                                    (user_id,) + values))
+                           for user_id, is_missing, values in chunk if not is_missing]
+                if missing:
+                    db.session.execute(table.insert(), missing)
+                if present:
+                    db.session.execute(update, present)
+            db.session.commit()
+        return mismatches
+
+
+class ScoreEpoch(db.Model):
+    """Reference time that stored, exponentially decayed scores are relative to."""
+    __tablename__ = 'score_epochs'
+    name = db.Column(db.String(64), primary_key=True)
+    epoch = db.Column(db.DateTime, nullable=False)
+
+    @staticmethod
+    def get(connection, name):
+        table = ScoreEpoch.__table__
+        epoch = connection.execute(db.select([table.c.epoch])
+                                   .where(table.c.name == name)).scalar()
+        if epoch is None:
+            # concurrent first uses race to insert; whichever epoch won is read back
+            connection.execute(db.text('INSERT INTO score_epochs (name, epoch) '
+                                       'VALUES (:name, :epoch) ON CONFLICT (name) DO NOTHING')
+                               .bindparams(db.bindparam('epoch', type_=db.DateTime)),
+                               name=name, epoch=datetime.utcnow())
+            epoch = connection.execute(db.select([table.c.epoch])
+                                       .where(table.c.name == name)).scalar()
+        return epoch
+
+    @staticmethod
+    def set(connection, name, epoch):
+        table = ScoreEpoch.__table__
+        if connection.execute(table.update().where(table.c.name == name)
+                              .values(epoch=epoch)).rowcount == 0:
+            connection.execute(table.insert().values(name=name, epoch=epoch))
 
 
 class Role(db.Model):
@@ -137,74 +316,78 @@ class User(UserMixin, db.Model):
         return True
 
     def can(self, permissions):
-        return self.role is not None and \
+        if self.role_id is None:
+            return self.role is not None and \
                 (self.role.permission & permissions) == permissions
+        permission = identity_cache.permission(self.role_id)
+        return permission is not None and (permission & permissions) == permissions
 
     def is_administrator(self):
         return self.can(Permission.ADMINISTER)
 
     def ping(self):
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
-        db.session.commit()
+        last_seen_buffer.touch(self.id)
 
     def is_following(self, user):
-        return self.followed.filter_by(followed_id=user.id).first() is not None
+        if self.id is None or user.id is None:
+            return False
+        return follow_graph.is_following(self.id, user.id)
 
     def is_followed_by(self, user):
-        return self.followers.filter_by(follower_id=user.id).first() is not None
+        return user.is_following(self)
+
+    def suggested_users(self, limit=10):
+        """People followed by the people this user follows, as (User, mutual count)."""
+        suggestions = follow_graph.suggestions(self.id, limit)
+        if not suggestions:
+            return []
+        users = dict((u.id, u) for u in
+                     User.query.filter(User.id.in_([i for i, n in suggestions])))
+        return [(users[i], n) for i, n in suggestions if i in users]
 
     def follow(self, user):
         if not self.is_following(user):
             f = Follow(follower=self, followed=user)
             db.session.add(f)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # committed by another process that this one's graph has not seen yet
+                db.session.rollback()
 
     def unfollow(self, user):
         print user, user.id
-        f = self.followed.filter_by(followed_id=user.id).first()
+        f = Follow.query.get((self.id, user.id))
         if f:
             db.session.delete(f)
             db.session.commit()
 
     def to_json(self):
+        stats = self.stats
         json_user = {
-            'url': url_for('api.get_question', id=self.id, _external=True),
+            'url': url_for('api.get_user', id=self.id, _external=True),
             'username': self.username,
-            'menber_since': self.menber_since,
+            'member_since': self.member_since,
             'last_seen': self.last_seen,
-            'questions': url_for('api.get_user_questions', id=self.id, _external=True),
             'followed_questions': url_for('api.get_user_followed_questions',
-                                      id=self.id, _external=True),
-            'question_count': self.questions.count()}
+                                      id=self.id, _external=True)}
+        for name in UserStats.counters:
+            json_user[name] = getattr(stats, name, 0)
         return json_user
 
     @staticmethod
     def generate_fake(count=200):
-        from sqlalchemy.exc import IntegrityError
-        from random import seed
-        import forgery_py
-
-        seed()
-        for i in range(count):
-            u = User(email=forgery_py.internet.email_address(),
-                     username=forgery_py.internet.user_name(True),
-                     password=forgery_py.lorem_ipsum.word(),
-                     confirmed=True,
-                     name=forgery_py.name.full_name(),
-                     location=forgery_py.address.city(),
-                     about_me=forgery_py.lorem_ipsum.sentence(),
-                     member_since=forgery_py.date.date(True))
-            db.session.add(u)
-            try:
-                db.session.commit()
-            except IntegrityError:
-                db.session.rollback()
+        from .seeding import Seeder
+        Seeder().users(count)
 
     @property
     def followed_questions(self):
-        return Question.query.join(Follow, Follow.followed_id == Question.author_id)\
-            .filter(Follow.follower_id == self.id)
+        return Question.query.join(Timeline, Timeline.question_id == Question.id)\
+            .filter(Timeline.user_id == self.id)
+
+    def has_followed_questions(self):
+        return db.session.query(Timeline.query.filter_by(user_id=self.id).exists())\
+            .scalar()
 
     @staticmethod
     def add_self_follows():
@@ -220,13 +403,20 @@ class User(UserMixin, db.Model):
         return s.dumps({'id': self.id})
 
     @staticmethod
-    def verify_auth_token(token):
+    def load_auth_token(token):
         s = Serializer(current_app.config['SECRET_KEY'])
         try:
-            data = s.loads(token)
+            data, header = s.loads(token, return_header=True)
         except:
+            return None, None
+        return data.get('id'), header.get('exp')
+
+    @staticmethod
+    def verify_auth_token(token):
+        user_id, expiration = User.load_auth_token(token)
+        if user_id is None:
             return None
-        return User.query.get(data['id'])
+        return User.query.get(user_id)
 
     def generate_reset_token(self, expiration=3600):
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -245,6 +435,22 @@ class User(UserMixin, db.Model):
         db.session.commit()
         return True
 
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        if not db.inspect(target).attrs.username.history.has_changes():
+            return
+        for model in (Question, Answer):
+            table = model.__table__
+            connection.execute(table.update()
+                               .where(table.c.author_id == target.id)
+                               .values(**touched(table)))
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        connection.execute(UserStats.__table__.insert().values(user_id=target.id))
+
+db.event.listen(User, 'before_update', User.on_updated)
+db.event.listen(User, 'after_insert', User.on_inserted)
 
 
 class Question(db.Model):
@@ -252,22 +458,46 @@ class Question(db.Model):
     id = db.Column(db.Integer(), primary_key=True)
     body = db.Column(db.Text)
     title = db.Column(db.String(300))
-    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     body_html = db.Column(db.Text)
     answers = db.relationship('Answer', backref='question', lazy='dynamic')
-
-    def to_json(self):
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    hot_score = db.Column(db.Float, default=0.0, server_default='0', nullable=False)
+
+    body_renderer = BodyRenderer(['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
+                                  'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
+                                  'h1', 'h2', 'h3', 'p'])
+
+    __table_args__ = (db.Index('ix_questions_timestamp_id', timestamp, id),
+                      db.Index('ix_questions_author_id_timestamp',
+                               author_id, timestamp, id),
+                      db.Index('ix_questions_hot_score', hot_score, id))
+
+    def to_json(self, answer_count=None):
+        if answer_count is None:
+            answer_count = self.answers.count()
         json_question = {
             'url': url_for('api.get_question', id=self.id, _external=True),
+            'title': self.title,
             'body': self.body,
             'body_html': self.body_html,
             'timestamp': self.timestamp,
             'author': url_for('api.get_user', id=self.author_id, _external=True),
-            'comments': url_for('api.get_question_comments', id=self.id, _external=True),
-            'comment_count': self.comments.count()}
+            'answer_count': answer_count}
         return json_question
 
+    @staticmethod
+    def answer_counts(question_ids):
+        """Answer count per question id, in one grouped query."""
+        counts = dict((question_id, 0) for question_id in question_ids)
+        if question_ids:
+            counts.update(db.session.query(Answer.question_id, db.func.count(Answer.id))
+                          .filter(Answer.question_id.in_(question_ids))
+                          .group_by(Answer.question_id))
+        return counts
+
     @staticmethod
     def from_json(json_question):
         body = json_question.get('body')
@@ -277,44 +507,143 @@ class Question(db.Model):
 
     @staticmethod
     def generate_fake(count=1000):
-        from random import seed, randint
-        import forgery_py
-
-        seed()
-        user_count = User.query.count()
-        for i in range(count):
-            u = User.query.offset(randint(0, user_count - 1)).first()
-            q = Question(title=forgery_py.lorem_ipsum.sentence(),
-                         body=forgery_py.lorem_ipsum.sentence(),
-                         timestamp=forgery_py.date.date(True),
-                         author=u)
-            db.session.add(q)
-        db.session.commit()
+        from .seeding import Seeder
+        Seeder().questions(count)
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
-                        'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
-                        'h1', 'h2', 'h3', 'p']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
+        if value == oldvalue and target.body_html is not None:
+            return
+        target.body_html = Question.body_renderer.render(value)
+
+    @staticmethod
+    def load_top_answers(question_ids, limit_row=1):
+        top_answers = dict((question_id, []) for question_id in question_ids)
+        if not question_ids or limit_row <= 0:
+            return top_answers
+        rank = db.func.row_number().over(
+            partition_by=Answer.question_id,
+            order_by=(Answer.vote_count.desc(), Answer.id)).label('rank')
+        ranked = db.session.query(Answer.id, rank)\
+            .filter(Answer.question_id.in_(question_ids)).subquery()
+        answers = Answer.query.join(ranked, Answer.id == ranked.c.id)\
+            .filter(ranked.c.rank <= limit_row)\
+            .options(db.joinedload(Answer.author))\
+            .order_by(Answer.question_id, ranked.c.rank)
+        for answer in answers:
+            top_answers[answer.question_id].append(answer)
+        return top_answers
 
     def top_answers(self, limit_row=1):
-        sql = db.text('SELECT answers.id \
-                      FROM answers LEFT OUTER JOIN votes \
-                      ON  answers.question_id and answers.id = votes.answer_id \
-                      WHERE answers.question_id = :val \
-                      GROUP BY answers.id \
-                      ORDER BY count(votes.id) DESC \
-                      LIMIT :limit_rows')
-        result = db.engine.execute(sql, val=self.id, limit_rows=limit_row)
-        row1 = []
-        for row in result:
-            row1.append(row[0])
-        return row1
+        result = db.session.query(Answer.id)\
+            .filter(Answer.question_id == self.id)\
+            .order_by(Answer.vote_count.desc(), Answer.id)\
+            .limit(limit_row)
+        return [row[0] for row in result]
+
+    @staticmethod
+    def hot_score_increment(connection, weight, timestamp):
+        """``weight`` decayed from ``timestamp``, relative to the stored epoch.
+
+        Scores are sums of ``weight * 2 ** ((t - epoch) / half_life)``, so an
+        event never has to be revisited as it ages: ordering by the stored
+        sum is the same as ordering by the decayed score at any later time.
+        """
+        epoch = ScoreEpoch.get(connection, 'questions.hot_score')
+        return Question.decayed_weight(weight, timestamp, epoch)
+
+    # 2 ** 1024 overflows a float; clamping well below that keeps sums finite
+    max_hot_score_exponent = 900
+
+    @staticmethod
+    def decayed_weight(weight, timestamp, epoch):
+        age = timestamp - epoch
+        seconds = age.days * 86400 + age.seconds + age.microseconds / 1e6
+        exponent = seconds / current_app.config['FLASK_TRENDING_HALF_LIFE']
+        if exponent > Question.max_hot_score_exponent:
+            current_app.logger.warning('Hot scores need a rebase: run manage.py '
+                                       'rebase_hot_scores')
+            exponent = Question.max_hot_score_exponent
+        return weight * 2.0 ** exponent
+
+    @staticmethod
+    def add_hot_score(connection, question_id, weight, timestamp):
+        questions = Question.__table__
+        increment = Question.hot_score_increment(connection, weight,
+                                                 timestamp or datetime.utcnow())
+        connection.execute(questions.update()
+                           .where(questions.c.id == question_id)
+                           .values(hot_score=questions.c.hot_score + increment))
+
+    @staticmethod
+    def rebase_hot_scores(chunk_size=1000):
+        """Recompute every hot score exactly, relative to a new epoch of now.
+
+        Repeated increments and decrements accumulate float error and the
+        stored values grow with time; running this periodically resets both.
+        """
+        config = current_app.config
+        epoch = datetime.utcnow()
+        connection = db.session.connection()
+        ScoreEpoch.set(connection, 'questions.hot_score', epoch)
+        scores = {}
+        events = [(db.session.query(Question.id, Question.timestamp),
+                   config['FLASK_TRENDING_QUESTION_WEIGHT']),
+                  (db.session.query(Answer.question_id, Answer.timestamp),
+                   config['FLASK_TRENDING_ANSWER_WEIGHT']),
+                  (db.session.query(Answer.question_id, Vote.timestamp)
+                   .join(Vote, Vote.answer_id == Answer.id),
+                   config['FLASK_TRENDING_VOTE_WEIGHT'])]
+        for query, weight in events:
+            for question_id, timestamp in query.yield_per(chunk_size):
+                if question_id is not None and timestamp is not None:
+                    scores[question_id] = scores.get(question_id, 0.0) + \
+                        Question.decayed_weight(weight, timestamp, epoch)
+        questions = Question.__table__
+        update = questions.update().where(questions.c.id == db.bindparam('b_id'))\
+            .values(hot_score=db.bindparam('b_hot_score'))
+        connection.execute(questions.update().values(hot_score=0))
+        items = list(scores.items())
+        for i in range(0, len(items), chunk_size):
+            connection.execute(update, [{'b_id': question_id, 'b_hot_score': score}
+                                        for question_id, score in items[i:i + chunk_size]])
+        db.session.commit()
+        return len(items)
+
+    @staticmethod
+    def on_before_insert(mapper, connection, target):
+        if target.timestamp is None:
+            target.timestamp = datetime.utcnow()
+        target.hot_score = Question.hot_score_increment(
+            connection, current_app.config['FLASK_TRENDING_QUESTION_WEIGHT'],
+            target.timestamp)
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        follows = Follow.__table__
+        fan_out = db.select([follows.c.follower_id, db.literal(target.id),
+                             db.literal(target.author_id),
+                             db.literal(target.timestamp, db.DateTime)])\
+            .where(follows.c.followed_id == target.author_id)
+        connection.execute(Timeline.__table__.insert().from_select(
+            ['user_id', 'question_id', 'author_id', 'timestamp'], fan_out))
+        UserStats.bump(connection, target.author_id, question_count=1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        UserStats.bump(connection, target.author_id, question_count=-1)
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        if db.object_session(target).is_modified(target, include_collections=False):
+            target.version = Question.version + 1
+            target.updated_at = datetime.utcnow()
 
 db.event.listen(Question.body, 'set', Question.on_changed_body)
+db.event.listen(Question, 'before_insert', Question.on_before_insert)
+db.event.listen(Question, 'after_insert', Question.on_inserted)
+db.event.listen(Question, 'after_delete', Question.on_deleted)
+db.event.listen(Question, 'before_update', Question.on_updated)
 
 
 class Answer(db.Model):
@@ -327,47 +656,99 @@ class Answer(db.Model):
     votes = db.relationship('Vote', backref='answer', lazy='dynamic')
     comments = db.relationship('Comment', backref='answer', lazy='dynamic')
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    vote_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    body_renderer = BodyRenderer(['a', 'abbr', 'acronym', 'b', 'code', 'em',
+                                  'i', 'strong'])
+
+    __table_args__ = (db.Index('ix_answers_question_id_vote_count',
+                               question_id, vote_count.desc()),
+                      db.Index('ix_answers_author_id_timestamp',
+                               author_id, timestamp, id))
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em'
-                                                             'i', 'strong']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
-
-    @staticmethod
-    def generate_fake():
-        from random import seed, randint
-        import forgery_py
-
-        seed()
-        user_count = User.query.count()
-        ques_count = Question.query.count()
-        for q in range(ques_count):
-            for j in range(randint(1, 10)):
-                u = User.query.offset(randint(0, user_count - 1)).first()
-                ques = Question.query.get(q)
-                a = Answer(body=forgery_py.lorem_ipsum.sentence(),
-                           timestamp=forgery_py.date.date(True),
-                           author=u,
-                           question=ques)
-                db.session.add(a)
+        if value == oldvalue and target.body_html is not None:
+            return
+        target.body_html = Answer.body_renderer.render(value)
+
+    @staticmethod
+    def generate_fake(per_question=5):
+        from .seeding import Seeder
+        Seeder().answers(Question.query.count() * per_question)
+
+    @staticmethod
+    def rebuild_vote_counts():
+        counts = db.select([db.func.count(Vote.id)])\
+            .where(Vote.answer_id == Answer.id).as_scalar()
+        Answer.query.update({Answer.vote_count: counts},
+                            synchronize_session=False)
         db.session.commit()
 
-    def to_json(self):
-        json_question = {
+    def to_json(self, comment_count=None):
+        if comment_count is None:
+            comment_count = self.comments.count()
+        json_answer = {
             'url': url_for('api.get_answer', id=self.id, _external=True),
             'body': self.body,
             'body_html': self.body_html,
             'timestamp': self.timestamp,
+            'vote_count': self.vote_count + vote_buffer.pending(self.id),
             'author': url_for('api.get_user', id=self.author_id, _external=True),
             'question': url_for('api.get_question', id=self.question_id, _external=True),
             'comments': url_for('api.get_answer_comments', id=self.id, _external=True),
-            'comment_count': self.comments.count()}
-        return json_question
+            'comment_count': comment_count}
+        return json_answer
+
+    @staticmethod
+    def comment_counts(answer_ids):
+        """Comment count per answer id, in one grouped query."""
+        counts = dict((answer_id, 0) for answer_id in answer_ids)
+        if answer_ids:
+            counts.update(db.session.query(Comment.answer_id, db.func.count(Comment.id))
+                          .filter(Comment.answer_id.in_(answer_ids))
+                          .group_by(Comment.answer_id))
+        return counts
+
+    @staticmethod
+    def on_count_changed(mapper, connection, target):
+        questions = Question.__table__
+        connection.execute(questions.update()
+                           .where(questions.c.id == target.question_id)
+                           .values(**touched(questions)))
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Question.add_hot_score(connection, target.question_id,
+                               current_app.config['FLASK_TRENDING_ANSWER_WEIGHT'],
+                               target.timestamp)
+        UserStats.bump(connection, target.author_id, answer_count=1)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Question.add_hot_score(connection, target.question_id,
+                               -current_app.config['FLASK_TRENDING_ANSWER_WEIGHT'],
+                               target.timestamp)
+        # the answer's votes are orphaned rather than deleted, so they stop
+        # counting towards the author here
+        UserStats.bump(connection, target.author_id, answer_count=-1,
+                       votes_received=-(target.vote_count or 0))
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        if db.object_session(target).is_modified(target, include_collections=False):
+            target.version = Answer.version + 1
+            target.updated_at = datetime.utcnow()
 
 db.event.listen(Answer.body, 'set', Answer.on_changed_body)
+db.event.listen(Answer, 'after_insert', Answer.on_count_changed)
+db.event.listen(Answer, 'after_delete', Answer.on_count_changed)
+db.event.listen(Answer, 'after_insert', Answer.on_inserted)
+db.event.listen(Answer, 'after_delete', Answer.on_deleted)
+db.event.listen(Answer, 'before_update', Answer.on_updated)
+search_index.watch(db.metadata, [(Question, ('title', 'body')), (Answer, ('body',))])
 
 
 class Vote(db.Model):
@@ -377,26 +758,124 @@ class Vote(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (db.Index('ix_votes_answer_id_author_id', answer_id, author_id,
+                               unique=True),)
+
+    # rows per INSERT; sqlite allows at most 500 terms in a compound SELECT
+    insert_chunk = 400
+
     def __repr__(self):
         return '<Vote %r>' % self.author_id
 
     @staticmethod
-    def generate_fake():
-        from random import seed, randint
-        import forgery_py
-
-        seed()
-        user_count = User.query.count()
-        answer_count = Question.query.count()
-        for a in range(answer_count):
-            for j in range(randint(1, 10)):
-                u = User.query.offset(randint(0, user_count - 1)).first()
-                answer = Answer.query.get(a)
-                v = Vote(timestamp=forgery_py.date.date(True),
-                         author=u,
-                         answer=answer)
-                db.session.add(v)
+    def generate_fake(per_answer=5):
+        from .seeding import Seeder
+        Seeder().votes(Answer.query.count() * per_answer)
+
+    @staticmethod
+    def count_votes(connection, answer_ids, delta, timestamp):
+        """Apply ``delta`` per vote on ``answer_ids`` to the derived counters.
+
+        That is answers.vote_count and version, the question's hot score and
+        the answer author's votes_received, each updated once per answer,
+        question or author however many votes are applied.
+        """
+        answers = Answer.__table__
+        per_answer = Counter(answer_ids)
+        rows = connection.execute(
+            db.select([answers.c.id, answers.c.question_id, answers.c.author_id])
+            .where(answers.c.id.in_(list(per_answer)))).fetchall()
+        if not rows:
+            return
+        per_question = Counter()
+        per_author = Counter()
+        for answer_id, question_id, author_id in rows:
+            per_question[question_id] += per_answer[answer_id]
+            per_author[author_id] += per_answer[answer_id]
+        connection.execute(answers.update()
+                           .where(answers.c.id == db.bindparam('b_id'))
+                           .values(vote_count=answers.c.vote_count + db.bindparam('b_delta'),
+                                   **touched(answers)),
+                           [{'b_id': answer_id, 'b_delta': delta * per_answer[answer_id]}
+                            for answer_id, _, _ in rows])
+        weight = current_app.config['FLASK_TRENDING_VOTE_WEIGHT']
+        for question_id, n in per_question.items():
+            Question.add_hot_score(connection, question_id, delta * n * weight, timestamp)
+        for author_id, n in per_author.items():
+            UserStats.bump(connection, author_id, votes_received=delta * n)
+
+    @staticmethod
+    def insert_votes(connection, votes):
+        """Insert (answer_id, author_id, timestamp) ``votes``, skipping repeats.
+
+        Votes go in as multi-row INSERT ... ON CONFLICT DO NOTHING
+        statements against the unique (answer_id, author_id) index, joined
+        to answers so votes on unknown answers are dropped, so there is no
+        read before the write and concurrent clicks cannot double count.
+        Counters are then bumped once per answer for the rows actually
+        inserted, whose (answer_id, author_id) pairs are returned.
+        """
+        inserted = []
+        for offset in range(0, len(votes), Vote.insert_chunk):
+            chunk = votes[offset:offset + Vote.insert_chunk]
+            params = {}
+            rows = []
+            for i, (answer_id, author_id, timestamp) in enumerate(chunk):
+                params.update({'a%d' % i: answer_id, 'u%d' % i: author_id,
+                               't%d' % i: timestamp})
+                rows.append('SELECT CAST(:a%d AS INTEGER) AS answer_id, '
+                            'CAST(:u%d AS INTEGER) AS author_id, :t%d AS timestamp'
+                            % (i, i, i))
+            insert = db.text(
+                'INSERT INTO votes (answer_id, author_id, timestamp) '
+                'SELECT v.answer_id, v.author_id, v.timestamp FROM (%s) AS v '
+                'JOIN answers ON answers.id = v.answer_id WHERE 1 = 1 '
+                'ON CONFLICT (answer_id, author_id) DO NOTHING '
+                'RETURNING answer_id, author_id' % ' UNION ALL '.join(rows))\
+                .bindparams(*[db.bindparam('t%d' % i, type_=db.DateTime)
+                              for i in range(len(chunk))])
+            result = connection.execute(insert, params)
+            # sqlite reports no result columns when RETURNING matched nothing
+            if result.returns_rows:
+                inserted.extend(tuple(row) for row in result)
+        if inserted:
+            Vote.count_votes(connection, [answer_id for answer_id, _ in inserted], 1,
+                             datetime.utcnow())
+        return inserted
+
+    @staticmethod
+    def voted(author_id, answer_ids):
+        """The ids among ``answer_ids`` that ``author_id`` has a stored vote on."""
+        if not answer_ids:
+            return set()
+        return set(row[0] for row in db.session.query(Vote.answer_id)
+                   .filter(Vote.author_id == author_id, Vote.answer_id.in_(answer_ids)))
+
+    @staticmethod
+    def cast(author_id, answer_ids):
+        """Vote as ``author_id`` on each of ``answer_ids`` now and commit.
+
+        Returns the ids of the answers that got a new vote.
+        """
+        now = datetime.utcnow()
+        inserted = Vote.insert_votes(db.session.connection(),
+                                     [(answer_id, author_id, now)
+                                      for answer_id in set(answer_ids)])
         db.session.commit()
+        if inserted:
+            page_cache.invalidate()
+        return [answer_id for answer_id, _ in inserted]
+
+    @staticmethod
+    def on_inserted(mapper, connection, target):
+        Vote.count_votes(connection, [target.answer_id], 1, target.timestamp)
+
+    @staticmethod
+    def on_deleted(mapper, connection, target):
+        Vote.count_votes(connection, [target.answer_id], -1, target.timestamp)
+
+db.event.listen(Vote, 'after_insert', Vote.on_inserted)
+db.event.listen(Vote, 'after_delete', Vote.on_deleted)
 
 
 class Comment(db.Model):
@@ -404,48 +883,56 @@ class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     body_html = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     disabled = db.Column(db.Boolean)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     answer_id = db.Column(db.Integer, db.ForeignKey('answers.id'))
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_comments_timestamp_id', timestamp, id),)
+
+    body_renderer = BodyRenderer(['a', 'abbr', 'acronym', 'b', 'code', 'em',
+                                  'i', 'strong'])
 
     @staticmethod
-    def generate_fake():
-        from random import seed, randint
-        import forgery_py
-
-        seed()
-        user_count = User.query.count()
-        answer_count = Question.query.count()
-        for i in range(answer_count):
-            for j in range(randint(1, 10)):
-                u = User.query.offset(randint(0, user_count - 1)).first()
-                answer = Answer.query.get(i)
-                c = Comment(body=forgery_py.lorem_ipsum.sentence(),
-                            timestamp=forgery_py.date.date(True),
-                            author=u, answer=answer)
-                db.session.add(c)
-        db.session.commit()
+    def generate_fake(per_answer=2):
+        from .seeding import Seeder
+        Seeder().comments(Answer.query.count() * per_answer)
 
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em'
-                        'i', 'strong']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
+        if value == oldvalue and target.body_html is not None:
+            return
+        target.body_html = Comment.body_renderer.render(value)
+
+    @staticmethod
+    def on_count_changed(mapper, connection, target):
+        answers = Answer.__table__
+        connection.execute(answers.update()
+                           .where(answers.c.id == target.answer_id)
+                           .values(**touched(answers)))
+
+    @staticmethod
+    def on_updated(mapper, connection, target):
+        if db.object_session(target).is_modified(target, include_collections=False):
+            target.version = Comment.version + 1
+            target.updated_at = datetime.utcnow()
 
     def to_json(self):
-        json_question = {
+        json_comment = {
             'url': url_for('api.get_comment', id=self.id, _external=True),
             'body': self.body,
             'body_html': self.body_html,
             'timestamp': self.timestamp,
             'author': url_for('api.get_user', id=self.author_id, _external=True),
-            'answer': url_for('api.get_answer', id=self.question_id, _external=True),}
-        return json_question
+            'answer': url_for('api.get_answer', id=self.answer_id, _external=True)}
+        return json_comment
 
 db.event.listen(Comment.body, 'set', Comment.on_changed_body)
+db.event.listen(Comment, 'after_insert', Comment.on_count_changed)
+db.event.listen(Comment, 'after_delete', Comment.on_count_changed)
+db.event.listen(Comment, 'before_update', Comment.on_updated)
 
 
 class AnonymousUser(AnonymousUserMixin):
@@ -458,7 +945,7 @@ class AnonymousUser(AnonymousUserMixin):
 
 @log_manager.user_loader
 def load_user(user_id):
-    return User.query.get(user_id)#key
+    return identity_cache.load_user(user_id)
 
 log_manager.anonymous_user = AnonymousUser
 
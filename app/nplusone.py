@@ -0,0 +1,115 @@
+import os
+import re
+import sys
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .exceptions import NPlusOneError
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.I)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    """Reduce a SQL statement to its shape: literals and IN lists collapsed."""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = re.sub(r'%\(\w+\)s|:\w+', '?', shape)
+    shape = _IN_LIST.sub('IN (?)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def _origin():
+    """The template and app frames that issued the current statement."""
+    template = view = None
+    frame = sys._getframe(2)
+    while frame is not None and (template is None or view is None):
+        jinja_template = frame.f_globals.get('__jinja_template__')
+        if jinja_template is not None:
+            if template is None:
+                template = '%s:%d' % (jinja_template.name, jinja_template
+                                      .get_corresponding_lineno(frame.f_lineno))
+        elif view is None:
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if filename.startswith(_APP_DIR) and filename != os.path.abspath(__file__):
+                view = '%s:%d in %s' % (os.path.relpath(filename, os.path.dirname(_APP_DIR)),
+                                        frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return template, view
+
+
+class QueryShapeDetector(object):
+    """Flags statements repeated with the same shape inside one request.
+
+    Enabled with FLASK_NPLUSONE_ENABLED. A shape seen more than
+    FLASK_NPLUSONE_THRESHOLD times is logged at the end of the request with
+    the template line and the app frame that first repeated it; with
+    FLASK_NPLUSONE_RAISE the offending statement raises NPlusOneError
+    instead, which fails the request.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('FLASK_NPLUSONE_ENABLED'):
+            return
+        app.extensions['nplusone'] = self
+        app.before_request(self._reset)
+        app.after_request(self._report)
+        if not QueryShapeDetector._listening:
+            event.listen(Engine, 'before_cursor_execute', self._on_execute)
+            QueryShapeDetector._listening = True
+
+    @staticmethod
+    def _reset():
+        g.query_shapes = {}
+
+    @staticmethod
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not has_request_context() or \
+                'nplusone' not in current_app.extensions:
+            return
+        shapes = getattr(g, 'query_shapes', None)
+        if shapes is None:
+            return
+        shape = normalize(statement)
+        entry = shapes.get(shape)
+        if entry is None:
+            shapes[shape] = [1, None]
+            return
+        entry[0] += 1
+        if entry[1] is None:
+            entry[1] = _origin()
+        threshold = current_app.config['FLASK_NPLUSONE_THRESHOLD']
+        if entry[0] == threshold + 1 and current_app.config['FLASK_NPLUSONE_RAISE']:
+            raise NPlusOneError(QueryShapeDetector.describe(shape, entry))
+
+    @staticmethod
+    def describe(shape, entry):
+        count, (template, view) = entry
+        return 'N+1 query: %d x %s\n  template: %s\n  view: %s' % (
+            count, shape, template or '-', view or '-')
+
+    @staticmethod
+    def suspects():
+        """(shape, count, origin) for every shape over the threshold so far."""
+        threshold = current_app.config['FLASK_NPLUSONE_THRESHOLD']
+        return [(shape, entry[0], entry[1])
+                for shape, entry in getattr(g, 'query_shapes', {}).items()
+                if entry[0] > threshold]
+
+    def _report(self, response):
+        for shape, count, origin in self.suspects():
+            current_app.logger.warning('%s %s\n%s' % (
+                request.method, request.path,
+                self.describe(shape, (count, origin))))
+        g.query_shapes = None
+        return response
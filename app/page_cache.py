@@ -0,0 +1,102 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from threading import Lock
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from flask_sqlalchemy import models_committed
+from .cache import LRUCache
+
+
+class _PageCacheState(object):
+    def __init__(self, maxsize):
+        self.pages = LRUCache(maxsize)
+        self.lock = Lock()
+        self.generation = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+
+
+class PageCache(object):
+    """Whole-page cache for anonymous GET requests.
+
+    Pages are keyed on endpoint and query string and dropped whenever a
+    question, answer or vote commit is seen by this process; entries also
+    expire after FLASK_PAGE_CACHE_TIMEOUT seconds so that changes committed
+    by other processes show up. Responses carry a strong ETag of the body
+    and a Last-Modified that moves whenever a rebuilt page's ETag differs
+    from the one it replaces, so conditional requests are answered with 304
+    only while the content is unchanged.
+    """
+
+    invalidating_models = ('Question', 'Answer', 'Vote')
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['page_cache'] = _PageCacheState(app.config['FLASK_PAGE_CACHE_SIZE'])
+        models_committed.connect(self._on_models_committed, sender=app)
+
+    def invalidate(self, app=None):
+        """Drop every cached page, e.g. after writes that bypass the ORM."""
+        (app or current_app).extensions['page_cache'].invalidate()
+
+    def _on_models_committed(self, app, changes):
+        for model, operation in changes:
+            if type(model).__name__ in self.invalidating_models:
+                self.invalidate(app)
+                return
+
+    @staticmethod
+    def _cacheable():
+        return request.method == 'GET' and current_user.is_anonymous and \
+            '_flashes' not in session
+
+    @staticmethod
+    def _finish(response, etag, last_modified):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    @staticmethod
+    def _last_modified(entry, etag):
+        """Keep the replaced entry's time if the body is the same, else move on."""
+        now = datetime.utcnow().replace(microsecond=0)
+        if entry is None:
+            return now
+        _, _, old_etag, _, old_last_modified = entry
+        if old_etag == etag:
+            return old_last_modified
+        # Last-Modified has one second resolution; a change must never reuse it
+        return max(now, old_last_modified + timedelta(seconds=1))
+
+    def cached(self, f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not self._cacheable():
+                return f(*args, **kwargs)
+            state = current_app.extensions['page_cache']
+            key = (request.endpoint, request.query_string)
+            generation = state.generation
+            entry = state.pages.get(key)
+            if entry is not None and entry[0] == generation and entry[1] > time.time():
+                _, _, etag, body, last_modified = entry
+                return self._finish(make_response(body), etag, last_modified)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            etag = hashlib.md5(body).hexdigest()
+            last_modified = self._last_modified(entry, etag)
+            expires = time.time() + current_app.config['FLASK_PAGE_CACHE_TIMEOUT']
+            state.pages.set(key, (generation, expires, etag, body, last_modified))
+            return self._finish(response, etag, last_modified)
+        return decorated_function
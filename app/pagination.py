@@ -0,0 +1,111 @@
+from datetime import datetime
+from flask import current_app, request
+from itsdangerous import URLSafeSerializer, BadSignature
+from . import db
+
+CURSOR_TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='cursor')
+
+
+def encode_cursor(timestamp, id, direction):
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime(CURSOR_TIME_FORMAT)
+    return _serializer().dumps([timestamp, id, direction])
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None, 'next'
+    try:
+        timestamp, id, direction = _serializer().loads(cursor)
+        # numeric sort keys such as scores are carried as they are
+        if not isinstance(timestamp, (int, float)):
+            timestamp = datetime.strptime(timestamp, CURSOR_TIME_FORMAT)
+    except (BadSignature, TypeError, ValueError):
+        return None, 'next'
+    if direction not in ('next', 'prev'):
+        direction = 'next'
+    return (timestamp, id), direction
+
+
+class KeysetPagination(object):
+    """Newest-first pagination keyed on (sort_column, id_column).
+
+    The sort column is normally a timestamp but may be any number, e.g. a
+    score, in which case pages run from the highest value down.
+
+    Unlike Query.paginate it never issues OFFSET or COUNT(*): every page is
+    a range scan starting at the key carried by an opaque cursor. ``key``
+    maps an item to its (sort, id) values when they are not read from
+    attributes named after the columns, e.g. when sorting on a joined table.
+    """
+
+    def __init__(self, query, sort_column, id_column, cursor=None, per_page=20,
+                 key=None):
+        self.sort_column = sort_column
+        self.id_column = id_column
+        self.per_page = per_page
+        self.key = key
+        position, direction = decode_cursor(cursor)
+        if position is not None:
+            timestamp, id = position
+            if direction == 'prev':
+                query = query.filter(db.or_(
+                    sort_column > timestamp,
+                    db.and_(sort_column == timestamp, id_column > id)))
+            else:
+                query = query.filter(db.or_(
+                    sort_column < timestamp,
+                    db.and_(sort_column == timestamp, id_column < id)))
+        if direction == 'prev':
+            query = query.order_by(sort_column.asc(), id_column.asc())
+        else:
+            query = query.order_by(sort_column.desc(), id_column.desc())
+        items = query.limit(per_page + 1).all()
+        more = len(items) > per_page
+        self.items = items[:per_page]
+        if direction == 'prev':
+            self.items.reverse()
+            self.has_prev = more
+            self.has_next = True
+        else:
+            self.has_prev = position is not None
+            self.has_next = more
+
+    def _cursor(self, item, direction):
+        if self.key is not None:
+            timestamp, id = self.key(item)
+        else:
+            timestamp = getattr(item, self.sort_column.key)
+            id = getattr(item, self.id_column.key)
+        return encode_cursor(timestamp, id, direction)
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        return self._cursor(self.items[0], 'prev')
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return self._cursor(self.items[-1], 'next')
+
+
+def paginate(query, sort_column, id_column, per_page,
+             cursor_arg='cursor', page_arg='page', key=None):
+    """Paginate newest first.
+
+    Requests carrying ``page_arg`` keep the page-number mode (OFFSET plus
+    COUNT) for shallow pages; everything else uses keyset pagination.
+    """
+    page = request.args.get(page_arg, type=int)
+    if page is not None:
+        return query.order_by(sort_column.desc(), id_column.desc()).paginate(
+            page, per_page=per_page, error_out=False)
+    return KeysetPagination(query, sort_column, id_column,
+                            request.args.get(cursor_arg), per_page, key)
@@ -0,0 +1,99 @@
+import atexit
+import time
+from datetime import datetime
+from threading import Lock, Thread, Event
+
+
+class LastSeenBuffer(object):
+    """Per-process write-behind buffer for User.last_seen.
+
+    Pings are collected in memory and written in one batched UPDATE once
+    FLASK_LAST_SEEN_FLUSH_INTERVAL seconds have passed or
+    FLASK_LAST_SEEN_FLUSH_SIZE users are pending; a background thread
+    flushes on the interval, so pings are written even when traffic stops.
+    A user pinged again within FLASK_LAST_SEEN_MIN_INTERVAL seconds is
+    ignored.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = Lock()
+        self._pending = {}
+        self._touched = {}
+        self._last_flush = time.time()
+        self._stop = Event()
+        self._flusher = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.app is None:
+            atexit.register(self.shutdown)
+        self.app = app
+
+    def touch(self, user_id):
+        config = self.app.config
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(user_id, 0) < config['FLASK_LAST_SEEN_MIN_INTERVAL']:
+                return
+            self._touched[user_id] = now
+            self._pending[user_id] = datetime.utcnow()
+            due = len(self._pending) >= config['FLASK_LAST_SEEN_FLUSH_SIZE'] or \
+                now - self._last_flush >= config['FLASK_LAST_SEEN_FLUSH_INTERVAL']
+        if due:
+            self.flush()
+        elif self._flusher is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = Thread(target=self._run, name='last-seen-flusher')
+            self._flusher.daemon = True
+        self._flusher.start()
+
+    def _run(self):
+        try:
+            while True:
+                interval = self.app.config['FLASK_LAST_SEEN_FLUSH_INTERVAL']
+                if interval <= 0 or self._stop.wait(interval):
+                    return
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Flushing last_seen failed')
+        finally:
+            with self._lock:
+                self._flusher = None
+
+    def shutdown(self):
+        """Stop the flusher thread and write what is still pending."""
+        self._stop.set()
+        flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+
+    def flush(self):
+        if self.app is None:
+            return
+        from . import db
+        from .models import User
+        now = time.time()
+        min_interval = self.app.config['FLASK_LAST_SEEN_MIN_INTERVAL']
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = now
+            self._touched = dict((user_id, touched)
+                                 for user_id, touched in self._touched.items()
+                                 if now - touched < min_interval)
+        if not pending:
+            return
+        users = User.__table__
+        update = users.update().where(users.c.id == db.bindparam('b_id'))\
+            .values(last_seen=db.bindparam('b_last_seen'))
+        with db.get_engine(self.app).begin() as connection:
+            connection.execute(update, [{'b_id': user_id, 'b_last_seen': last_seen}
+                                        for user_id, last_seen in pending.items()])
@@ -0,0 +1,93 @@
+import hashlib
+from threading import local
+import bleach
+from markdown import Markdown
+from .cache import LRUCache
+
+try:
+    from bleach.sanitizer import Cleaner
+except ImportError:  # bleach < 2.0 only has the module level functions
+    Cleaner = None
+
+RENDER_CACHE_SIZE = 4096
+
+render_cache = LRUCache(RENDER_CACHE_SIZE)
+
+
+class BodyRenderer(object):
+    """Markdown -> sanitized, linkified HTML for one tag whitelist.
+
+    Results are cached by a digest of the source text plus a version derived
+    from the whitelist, so changing the whitelist never serves stale HTML.
+    """
+
+    def __init__(self, allowed_tags, cache=render_cache):
+        self.allowed_tags = list(allowed_tags)
+        self.version = hashlib.sha1(
+            ','.join(sorted(self.allowed_tags)).encode('utf-8')).hexdigest()[:8]
+        self.cache = cache
+        self._local = local()
+        if Cleaner is not None:
+            self._cleaner = Cleaner(tags=self.allowed_tags, strip=True)
+        else:
+            self._cleaner = None
+
+    def _markdown(self):
+        md = getattr(self._local, 'markdown', None)
+        if md is None:
+            md = self._local.markdown = Markdown(output_format='html')
+        return md.reset()
+
+    def _sanitize(self, html):
+        if self._cleaner is not None:
+            return self._cleaner.clean(html)
+        return bleach.clean(html, tags=self.allowed_tags, strip=True)
+
+    def key(self, text):
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8')
+        return self.version + ':' + hashlib.sha1(text).hexdigest()
+
+    def render_uncached(self, text):
+        return bleach.linkify(self._sanitize(self._markdown().convert(text)))
+
+    def render(self, text):
+        if text is None:
+            return None
+        key = self.key(text)
+        html = self.cache.get(key)
+        if html is None:
+            html = self.render_uncached(text)
+            self.cache.set(key, html)
+        return html
+
+    def render_many(self, texts):
+        """Render a batch, converting each distinct text only once."""
+        rendered = {}
+        for text in texts:
+            if text not in rendered:
+                rendered[text] = self.render(text)
+        return [rendered[text] for text in texts]
+
+
+def rerender_bodies(model, chunk_size=1000):
+    """Recompute body_html for every row of ``model`` in bulk."""
+    from . import db
+    table = model.__table__
+    update = table.update().where(table.c.id == db.bindparam('b_id'))\
+        .values(body_html=db.bindparam('b_body_html'))
+    last_id = 0
+    count = 0
+    while True:
+        rows = db.session.query(model.id, model.body)\
+            .filter(model.id > last_id).order_by(model.id)\
+            .limit(chunk_size).all()
+        if not rows:
+            break
+        html = model.body_renderer.render_many([row.body for row in rows])
+        db.session.execute(update, [{'b_id': row.id, 'b_body_html': body_html}
+                                    for row, body_html in zip(rows, html)])
+        db.session.commit()
+        last_id = rows[-1].id
+        count += len(rows)
+    return count
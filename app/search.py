@@ -0,0 +1,213 @@
+import re
+from collections import namedtuple
+from flask import current_app
+from flask_sqlalchemy import Pagination
+from jinja2 import Markup, escape
+from sqlalchemy import event, text
+
+_CJK = u'\u2e80-\u2fdf\u3040-\u30ff\u3100-\u312f\u3400-\u4dbf\u4e00-\u9fff' \
+       u'\uac00-\ud7af\uf900-\ufaff\uff00-\uffef'
+_CJK_CHAR = re.compile(u'([%s])' % _CJK)
+_CJK_GAP = re.compile(u'(?:(?<=[%s])|(?<=[%s][\x02\x03])) +(?=[\x02\x03]?[%s])'
+                      % (_CJK, _CJK, _CJK))
+_SPACE = re.compile(r'\s+')
+
+_OPEN, _CLOSE, _ELLIPSIS = u'\x02', u'\x03', u'\u2026'
+
+SearchResult = namedtuple('SearchResult', 'kind id question snippet rank')
+
+
+def _segment_cjk(text):
+    """Split CJK runs into single characters so unicode61 indexes each one.
+
+    Queries are segmented the same way and matched as phrases, so a
+    multi-character word only matches where its characters are adjacent.
+    """
+    return _SPACE.sub(u' ', _CJK_CHAR.sub(u' \\1 ', text)).strip()
+
+
+def _segment_jieba(text):
+    import jieba
+    return u' '.join(jieba.cut_for_search(text))
+
+
+segmenters = {
+    'none': lambda text: text,
+    'cjk': _segment_cjk,
+    'jieba': _segment_jieba,
+}
+
+
+class SearchIndex(object):
+    """SQLite FTS5 index over question titles/bodies and answer bodies.
+
+    The virtual table is created alongside the models by ``create_all`` (or
+    the matching migration) and kept up to date by mapper events: the
+    ``set`` events on the indexed columns mark the instance stale and the
+    row is rewritten after it is flushed. Text is run through the
+    FLASK_SEARCH_SEGMENTER before FTS5's FLASK_SEARCH_TOKENIZER sees it,
+    which is how CJK text is split into searchable units. Row ids are
+    ``2 * id`` for questions and ``2 * id + 1`` for answers.
+    """
+
+    table = 'search_index'
+    kinds = {'questions': 0, 'answers': 1}
+    _delete = text('DELETE FROM search_index WHERE rowid = :rowid')
+    _insert = text('INSERT INTO search_index (rowid, title, body, question_id) '
+                   'VALUES (:rowid, :title, :body, :question_id)')
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FLASK_SEARCH_TOKENIZER', 'unicode61')
+        app.config.setdefault('FLASK_SEARCH_SEGMENTER', 'cjk')
+        app.config.setdefault('FLASK_SEARCH_PER_PAGE', 20)
+
+    @staticmethod
+    def _enabled(bind):
+        return bind.dialect.name == 'sqlite'
+
+    @staticmethod
+    def segment(text, app=None):
+        app = app or current_app
+        return segmenters[app.config['FLASK_SEARCH_SEGMENTER']](text or u'')
+
+    def create(self, bind, tokenizer='unicode61'):
+        if self._enabled(bind):
+            bind.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5("
+                         "title, body, question_id UNINDEXED, tokenize='%s')"
+                         % (self.table, tokenizer.replace("'", "''")))
+
+    def drop(self, bind):
+        if self._enabled(bind):
+            bind.execute('DROP TABLE IF EXISTS %s' % self.table)
+
+    def _on_metadata_create(self, target, connection, **kw):
+        self.create(connection, current_app.config['FLASK_SEARCH_TOKENIZER'])
+
+    def _on_metadata_drop(self, target, connection, **kw):
+        self.drop(connection)
+
+    def watch(self, metadata, models):
+        """Keep the index in sync with ``models`` and create it with ``metadata``."""
+        event.listen(metadata, 'after_create', self._on_metadata_create)
+        event.listen(metadata, 'before_drop', self._on_metadata_drop)
+        for model, columns in models:
+            for column in columns:
+                event.listen(getattr(model, column), 'set', self.on_changed_text)
+            event.listen(model, 'after_insert', self.on_flushed)
+            event.listen(model, 'after_update', self.on_flushed)
+            event.listen(model, 'after_delete', self.on_deleted)
+
+    def rowid(self, target):
+        return target.id * 2 + self.kinds[target.__tablename__]
+
+    def _document(self, target):
+        return {'rowid': self.rowid(target),
+                'title': self.segment(getattr(target, 'title', None)),
+                'body': self.segment(target.body),
+                'question_id': getattr(target, 'question_id', None) or target.id}
+
+    @staticmethod
+    def on_changed_text(target, value, oldvalue, initiator):
+        if value != oldvalue:
+            target._search_stale = True
+
+    def on_flushed(self, mapper, connection, target):
+        if not getattr(target, '_search_stale', False) or not self._enabled(connection):
+            return
+        target._search_stale = False
+        connection.execute(self._delete, rowid=self.rowid(target))
+        connection.execute(self._insert, self._document(target))
+
+    def on_deleted(self, mapper, connection, target):
+        if self._enabled(connection):
+            connection.execute(self._delete, rowid=self.rowid(target))
+
+    def rebuild(self, chunk_size=1000):
+        """Recreate the index from every question and answer."""
+        from . import db
+        from .models import Question, Answer
+        engine = db.get_engine(current_app)
+        if not self._enabled(engine):
+            return 0
+        self.drop(engine)
+        self.create(engine, current_app.config['FLASK_SEARCH_TOKENIZER'])
+        count = 0
+        for model in (Question, Answer):
+            columns = [model.id, model.body]
+            columns.append(model.title if model is Question else model.question_id)
+            last_id = 0
+            while True:
+                rows = db.session.query(*columns).filter(model.id > last_id)\
+                    .order_by(model.id).limit(chunk_size).all()
+                if not rows:
+                    break
+                docs = []
+                for row in rows:
+                    if model is Question:
+                        docs.append({'rowid': row.id * 2, 'title': self.segment(row.title),
+                                     'body': self.segment(row.body), 'question_id': row.id})
+                    else:
+                        docs.append({'rowid': row.id * 2 + 1, 'title': u'',
+                                     'body': self.segment(row.body),
+                                     'question_id': row.question_id})
+                db.session.execute(self._insert, docs)
+                db.session.commit()
+                last_id = rows[-1].id
+                count += len(rows)
+        db.session.execute("INSERT INTO %s (%s) VALUES ('optimize')" % (self.table, self.table))
+        db.session.commit()
+        return count
+
+    def match_expression(self, query):
+        """Turn user input into an FTS5 query of ANDed, quoted phrases."""
+        phrases = []
+        for term in query.split():
+            term = self.segment(term)
+            if term:
+                phrases.append(u'"%s"' % term.replace(u'"', u'""'))
+        return u' '.join(phrases)
+
+    @staticmethod
+    def _snippet(text):
+        text = _CJK_GAP.sub(u'', text)
+        html = escape(text)
+        return Markup(html.replace(_OPEN, Markup(u'<mark>'))
+                      .replace(_CLOSE, Markup(u'</mark>')))
+
+    def search(self, query, page=1, per_page=None):
+        """Ranked results for ``query`` as a Pagination of SearchResult."""
+        from . import db
+        from .models import Question
+        per_page = per_page or current_app.config['FLASK_SEARCH_PER_PAGE']
+        expression = self.match_expression(query or u'')
+        if not expression or not self._enabled(db.get_engine(current_app)):
+            return Pagination(None, page, per_page, 0, [])
+        total = db.session.execute(
+            text('SELECT count(*) FROM %s WHERE %s MATCH :q' % (self.table, self.table)),
+            {'q': expression}).scalar()
+        rows = db.session.execute(text(
+            'SELECT rowid, question_id, '
+            "snippet(%s, -1, :open, :close, :ellipsis, 24) AS snippet, "
+            'bm25(%s, 4.0, 1.0) AS rank '
+            'FROM %s WHERE %s MATCH :q ORDER BY rank LIMIT :limit OFFSET :offset'
+            % ((self.table,) * 4)),
+            {'q': expression, 'open': _OPEN, 'close': _CLOSE, 'ellipsis': _ELLIPSIS,
+             'limit': per_page, 'offset': (page - 1) * per_page}).fetchall()
+        question_ids = set(row.question_id for row in rows)
+        questions = {}
+        if question_ids:
+            questions = dict((q.id, q) for q in Question.query
+                             .options(db.joinedload(Question.author))
+                             .filter(Question.id.in_(question_ids)))
+        items = []
+        for row in rows:
+            kind = 'question' if row.rowid % 2 == 0 else 'answer'
+            question = questions.get(row.question_id)
+            if question is not None:
+                items.append(SearchResult(kind, row.rowid // 2, question,
+                                          self._snippet(row.snippet), row.rank))
+        return Pagination(None, page, per_page, total, items)
@@ -0,0 +1,295 @@
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from forgery_py.dictionaries_loader import get_dictionary
+from . import db
+from .models import Role, User, Follow, Timeline, Question, Answer, Vote, Comment
+
+SEED_PASSWORD = 'password'
+
+
+class Seeder(object):
+    """Bulk, deterministic generator of fake users, questions and votes.
+
+    Rows are built from id arrays held in memory instead of per-row
+    ``User.query.offset(...)`` lookups and written with chunked executemany
+    INSERTs. Bodies come from a fixed pool, so rendering them to HTML costs
+    one markdown pass per distinct text rather than one per row.
+    Denormalized data that the ORM events would normally maintain
+    (vote_count, versions, timelines) is maintained here in bulk as well.
+    ``report``, if given, is called with (table, rows, seconds) after each
+    table is written.
+    """
+
+    def __init__(self, seed=None, chunk_size=10000, body_pool=512, report=None):
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.report = report
+        self._ids = {}
+        self._html = {}
+        sentences = [s.strip() for s in get_dictionary('lorem_ipsum')]
+        self.titles = sentences
+        self.bodies = [' '.join(self.rng.sample(sentences, self.rng.randint(1, 4)))
+                       for i in range(body_pool)]
+        self.first_names = [n.strip() for n in get_dictionary('male_first_names')]
+        self.last_names = [n.strip() for n in get_dictionary('last_names')]
+        self.cities = [n.strip() for n in get_dictionary('cities')]
+        self.now = datetime.utcnow()
+
+    def _done(self, table, rows, start):
+        if self.report is not None:
+            self.report(table, rows, time.time() - start)
+
+    def ids(self, model):
+        if model not in self._ids:
+            self._ids[model] = array('l', (row[0] for row in
+                                           db.session.query(model.id).order_by(model.id)))
+        return self._ids[model]
+
+    def _next_id(self, model):
+        ids = self.ids(model)
+        return ids[-1] + 1 if ids else 1
+
+    def _timestamp(self, days=365):
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+    def _body(self, model):
+        html = self._html.get(model)
+        if html is None:
+            html = self._html[model] = [None] * len(self.bodies)
+        i = self.rng.randrange(len(self.bodies))
+        if html[i] is None:
+            html[i] = model.body_renderer.render(self.bodies[i])
+        return self.bodies[i], html[i]
+
+    def _insert(self, table, rows):
+        if rows:
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+
+    @staticmethod
+    def _existing(key, other, ids):
+        """(key, other) pairs already stored for the sorted ``ids`` chunk."""
+        if not ids:
+            return set()
+        return set(tuple(row) for row in
+                   db.session.query(key, other).filter(key.between(ids[0], ids[-1])))
+
+    def _chunks(self, count):
+        done = 0
+        while done < count:
+            size = min(self.chunk_size, count - done)
+            yield size
+            done += size
+
+    def users(self, count):
+        start = time.time()
+        role = Role.query.filter_by(default=True).first()
+        password_hash = generate_password_hash(SEED_PASSWORD)
+        first_id = next_id = self._next_id(User)
+        for size in self._chunks(count):
+            users, follows = [], []
+            for user_id in range(next_id, next_id + size):
+                first = self.rng.choice(self.first_names)
+                last = self.rng.choice(self.last_names)
+                member_since = self._timestamp(3 * 365)
+                users.append({'id': user_id,
+                              'email': 'user%d@example.com' % user_id,
+                              'username': '%s%d' % (first.lower(), user_id),
+                              'password_hash': password_hash,
+                              'confirmed': True,
+                              'name': '%s %s' % (first, last),
+                              'location': self.rng.choice(self.cities),
+                              'about_me': self.rng.choice(self.titles),
+                              'member_since': member_since,
+                              'last_seen': member_since,
+                              'role_id': role.id if role else None})
+                follows.append({'follower_id': user_id, 'followed_id': user_id,
+                                'timestamp': member_since})
+            self._insert(User.__table__, users)
+            self._insert(Follow.__table__, follows)
+            self.ids(User).extend(range(next_id, next_id + size))
+            next_id += size
+        self._done('users', next_id - first_id, start)
+
+    def follows(self, per_user):
+        start = time.time()
+        users = self.ids(User)
+        rows_total = 0
+        for offset in range(0, len(users), self.chunk_size):
+            rows = []
+            followers = users[offset:offset + self.chunk_size]
+            existing = self._existing(Follow.follower_id, Follow.followed_id, followers)
+            for follower_id in followers:
+                for followed_id in self.rng.sample(users, min(per_user, len(users))):
+                    if followed_id == follower_id or \
+                            (follower_id, followed_id) in existing:
+                        continue
+                    existing.add((follower_id, followed_id))
+                    rows.append({'follower_id': follower_id,
+                                 'followed_id': followed_id,
+                                 'timestamp': self._timestamp()})
+            self._insert(Follow.__table__, rows)
+            rows_total += len(rows)
+        if self.ids(Question):
+            Timeline.rebuild()
+        self._done('follows', rows_total, start)
+
+    def questions(self, count):
+        start = time.time()
+        users = self.ids(User)
+        if not users:
+            return
+        first_id = next_id = self._next_id(Question)
+        fan_out = Timeline.__table__.insert().from_select(
+            ['user_id', 'question_id', 'author_id', 'timestamp'],
+            db.select([Follow.follower_id, Question.id,
+                       Question.author_id, Question.timestamp])
+            .where(Follow.followed_id == Question.author_id)
+            .where(Question.id.between(db.bindparam('lo'), db.bindparam('hi'))))
+        for size in self._chunks(count):
+            rows = []
+            for question_id in range(next_id, next_id + size):
+                body, body_html = self._body(Question)
+                timestamp = self._timestamp()
+                rows.append({'id': question_id,
+                             'title': self.rng.choice(self.titles),
+                             'body': body,
+                             'body_html': body_html,
+                             'timestamp': timestamp,
+                             'updated_at': timestamp,
+                             'author_id': self.rng.choice(users),
+                             'version': 1})
+            self._insert(Question.__table__, rows)
+            db.session.execute(fan_out, {'lo': next_id, 'hi': next_id + size - 1})
+            db.session.commit()
+            self.ids(Question).extend(range(next_id, next_id + size))
+            next_id += size
+        self._done('questions', next_id - first_id, start)
+
+    def answers(self, count):
+        start = time.time()
+        users = self.ids(User)
+        questions = self.ids(Question)
+        if not users or not questions:
+            return
+        first_id = next_id = self._next_id(Answer)
+        bump = Question.__table__.update()\
+            .where(Question.id == db.bindparam('b_id'))\
+            .values(version=Question.version + db.bindparam('b_count'))
+        for size in self._chunks(count):
+            rows = []
+            touched = {}
+            for answer_id in range(next_id, next_id + size):
+                question_id = self.rng.choice(questions)
+                touched[question_id] = touched.get(question_id, 0) + 1
+                body, body_html = self._body(Answer)
+                timestamp = self._timestamp()
+                rows.append({'id': answer_id,
+                             'body': body,
+                             'body_html': body_html,
+                             'question_id': question_id,
+                             'author_id': self.rng.choice(users),
+                             'timestamp': timestamp,
+                             'updated_at': timestamp,
+                             'vote_count': 0,
+                             'version': 1})
+            self._insert(Answer.__table__, rows)
+            db.session.execute(bump, [{'b_id': question_id, 'b_count': n}
+                                      for question_id, n in touched.items()])
+            db.session.commit()
+            self.ids(Answer).extend(range(next_id, next_id + size))
+            next_id += size
+        self._done('answers', next_id - first_id, start)
+
+    def votes(self, count):
+        """Spread about ``count`` votes over the answers, at most one per user.
+
+        Pairs already stored by an earlier run are skipped, like existing
+        follows in :meth:`follows`, so seeding an existing database again
+        does not trip the unique indexes.
+        """
+        start = time.time()
+        users = self.ids(User)
+        answers = self.ids(Answer)
+        if not answers or not users:
+            return
+        mean = float(count) / len(answers)
+        bump = Answer.__table__.update()\
+            .where(Answer.id == db.bindparam('b_id'))\
+            .values(vote_count=Answer.vote_count + db.bindparam('b_count'),
+                    version=Answer.version + 1)
+        rows_total = 0
+        for offset in range(0, len(answers), self.chunk_size):
+            rows, counts = [], []
+            chunk = answers[offset:offset + self.chunk_size]
+            existing = self._existing(Vote.answer_id, Vote.author_id, chunk)
+            for answer_id in chunk:
+                n = min(int(round(self.rng.expovariate(1 / mean))) if mean else 0, len(users))
+                if not n:
+                    continue
+                authors = [author_id for author_id in self.rng.sample(users, n)
+                           if (answer_id, author_id) not in existing]
+                if not authors:
+                    continue
+                for author_id in authors:
+                    rows.append({'answer_id': answer_id, 'author_id': author_id,
+                                 'timestamp': self._timestamp()})
+                counts.append({'b_id': answer_id, 'b_count': len(authors)})
+            self._insert(Vote.__table__, rows)
+            if counts:
+                db.session.execute(bump, counts)
+                db.session.commit()
+            rows_total += len(rows)
+        self._done('votes', rows_total, start)
+
+    def comments(self, count):
+        start = time.time()
+        users = self.ids(User)
+        answers = self.ids(Answer)
+        if not users or not answers:
+            return
+        bump = Answer.__table__.update()\
+            .where(Answer.id == db.bindparam('b_id'))\
+            .values(version=Answer.version + db.bindparam('b_count'))
+        rows_total = 0
+        for size in self._chunks(count):
+            rows = []
+            touched = {}
+            for i in range(size):
+                answer_id = self.rng.choice(answers)
+                touched[answer_id] = touched.get(answer_id, 0) + 1
+                body, body_html = self._body(Comment)
+                timestamp = self._timestamp()
+                rows.append({'body': body,
+                             'body_html': body_html,
+                             'timestamp': timestamp,
+                             'updated_at': timestamp,
+                             'disabled': False,
+                             'author_id': self.rng.choice(users),
+                             'answer_id': answer_id,
+                             'version': 1})
+            self._insert(Comment.__table__, rows)
+            db.session.execute(bump, [{'b_id': answer_id, 'b_count': n}
+                                      for answer_id, n in touched.items()])
+            db.session.commit()
+            rows_total += len(rows)
+        self._done('comments', rows_total, start)
+
+    def run(self, users=0, follows=0, questions=0, answers=0, votes=0, comments=0):
+        start = time.time()
+        if users:
+            self.users(users)
+        if follows:
+            self.follows(follows)
+        if questions:
+            self.questions(questions)
+        if answers:
+            self.answers(answers)
+        if votes:
+            self.votes(votes)
+        if comments:
+            self.comments(comments)
+        return time.time() - start
@@ -0,0 +1,179 @@
+import atexit
+import signal
+import weakref
+from collections import Counter, OrderedDict
+from datetime import datetime
+from threading import Thread, Lock, Event
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+class _VoteBufferState(object):
+    def __init__(self, app):
+        self.app = app
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.pending = {}
+        self.inflight = {}
+        self.counts = Counter()
+        self.stop = Event()
+        self.flusher = None
+
+
+class VoteBuffer(object):
+    """Per-process write-behind buffer for votes.
+
+    A vote is accepted in memory, unless the same user's vote on that
+    answer is already pending or stored, and written with the other
+    pending votes in grouped multi-row inserts by a background thread every
+    FLASK_VOTE_FLUSH_INTERVAL seconds, or at once when FLASK_VOTE_FLUSH_SIZE
+    votes are pending, so a viral answer costs one transaction per flush
+    rather than one per click. An interval of 0 writes every vote
+    synchronously. A batch that fails on a locked or unreachable database
+    stays pending for the next flush, and ``pending`` lets readers add
+    unflushed votes to the stored counts.
+
+    Whatever is pending is flushed from an atexit hook. Python skips atexit
+    when a process dies of an unhandled SIGTERM, so if SIGTERM still has
+    its default action when the buffer is set up in the main thread, it is
+    turned into SystemExit. Servers that install their own handler, such as
+    gunicorn and uWSGI workers, are left alone; they exit through
+    ``sys.exit`` and run atexit hooks themselves.
+    """
+
+    def __init__(self, app=None):
+        self._apps = weakref.WeakSet()
+        self._registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['vote_buffer'] = _VoteBufferState(app)
+        app.add_template_global(self.pending, 'pending_votes')
+        # one atexit hook for every app, so test apps are not kept alive
+        if not self._registered:
+            atexit.register(self._shutdown_all)
+            self._exit_on_sigterm()
+            self._registered = True
+        self._apps.add(app)
+
+    @staticmethod
+    def _exit_on_sigterm():
+        try:
+            if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, _exit_on_sigterm)
+        except ValueError:
+            pass    # not the main thread; only it may set handlers
+
+    def _shutdown_all(self):
+        for app in list(self._apps):
+            self.shutdown(app)
+
+    def _state(self, app=None):
+        return (app or current_app).extensions['vote_buffer']
+
+    def add(self, author_id, answer_id):
+        """Accept a vote; False if the same vote is waiting or stored."""
+        return bool(self.add_many(author_id, [answer_id]))
+
+    def add_many(self, author_id, answer_ids):
+        """Accept votes on ``answer_ids``; returns the ids that were new.
+
+        Stored votes are looked up with one query for the whole batch.
+        """
+        from .models import Vote
+        state = self._state()
+        config = state.app.config
+        answer_ids = list(OrderedDict.fromkeys(answer_ids))
+        stored = Vote.voted(author_id, answer_ids)
+        accepted = []
+        with state.lock:
+            for answer_id in answer_ids:
+                key = (answer_id, author_id)
+                if answer_id in stored or key in state.pending or key in state.inflight:
+                    continue
+                state.pending[key] = datetime.utcnow()
+                state.counts[answer_id] += 1
+                accepted.append(answer_id)
+            due = len(state.pending) >= config['FLASK_VOTE_FLUSH_SIZE'] or \
+                config['FLASK_VOTE_FLUSH_INTERVAL'] <= 0
+        if not accepted:
+            return accepted
+        if due:
+            self.flush(state.app)
+        else:
+            self._start(state)
+        return accepted
+
+    def pending(self, answer_id):
+        """Votes on ``answer_id`` accepted but not yet committed."""
+        return self._state().counts.get(answer_id, 0)
+
+    def _start(self, state):
+        if state.flusher is not None:
+            return
+        with state.lock:
+            if state.flusher is not None:
+                return
+            state.flusher = Thread(target=self._run, args=(state,), name='vote-flusher')
+            state.flusher.daemon = True
+            state.flusher.start()
+
+    def _run(self, state):
+        interval = state.app.config['FLASK_VOTE_FLUSH_INTERVAL']
+        with state.app.app_context():
+            while not state.stop.wait(interval):
+                self.flush(state.app)
+
+    def flush(self, app=None):
+        """Write every pending vote and return how many rows were new."""
+        from . import db, page_cache
+        from .models import Vote
+        state = self._state(app)
+        with state.flush_lock:
+            with state.lock:
+                batch, state.pending = state.pending, {}
+                state.inflight = batch
+            if not batch:
+                return 0
+            inserted = []
+            retry = False
+            try:
+                with db.get_engine(state.app).begin() as connection:
+                    inserted = Vote.insert_votes(
+                        connection, [(answer_id, author_id, timestamp)
+                                     for (answer_id, author_id), timestamp
+                                     in batch.items()])
+                if inserted:
+                    page_cache.invalidate(state.app)
+            except OperationalError:
+                # locked or unreachable database: keep the votes for the next flush
+                retry = True
+                state.app.logger.exception('Retrying %d buffered votes' % len(batch))
+            except Exception:
+                state.app.logger.exception('Dropping %d buffered votes' % len(batch))
+            finally:
+                with state.lock:
+                    state.inflight = {}
+                    if retry:
+                        batch.update(state.pending)
+                        state.pending = batch
+                    else:
+                        state.counts.subtract(answer_id for answer_id, _ in batch)
+                        for answer_id in set(answer_id for answer_id, _ in batch):
+                            if state.counts.get(answer_id, 0) <= 0:
+                                state.counts.pop(answer_id, None)
+            return len(inserted)
+
+    def shutdown(self, app=None):
+        """Stop the flusher thread and write what is still pending."""
+        state = self._state(app)
+        state.stop.set()
+        if state.flusher is not None:
+            state.flusher.join()
+        with state.app.app_context():
+            self.flush(state.app)
@@ -46,6 +46,177 @@ def deploy():
     # db.session.commit()
 
 
+@manager.command
+def rebuild_vote_counts():
+    """Recompute answers.vote_count from the votes table."""
+    Answer.rebuild_vote_counts()
+
+
+@manager.command
+def rebuild_timelines():
+    """Recompute every user's home timeline from follows and questions."""
+    from app.models import Timeline
+    Timeline.rebuild()
+
+
+@manager.command
+def rerender_bodies():
+    """Re-render body_html for every question, answer and comment."""
+    from app.rendering import rerender_bodies
+    for model in (Question, Answer, Comment):
+        print('%s: %d rows' % (model.__tablename__, rerender_bodies(model)))
+
+
+@manager.command
+def rebase_hot_scores():
+    """Recompute trending hot scores against a fresh epoch (run periodically)."""
+    print('%d questions scored' % Question.rebase_hot_scores())
+
+
+@manager.option('--repair', dest='repair', action='store_true', default=False)
+def verify_user_stats(repair):
+    """Compare user_stats with the source tables, optionally fixing drift.
+
+    Each mismatch is listed when only checking; a repair prints the count.
+    """
+    from app.models import UserStats
+    mismatches = UserStats.verify(repair)
+    if not repair:
+        for user_id, name, stored, expected in mismatches:
+            print('user %d %s: stored %s, expected %d' % (user_id, name, stored, expected))
+    print('%d mismatches%s' % (len(mismatches), ', repaired' if repair and mismatches else ''))
+
+
+@manager.command
+def rebuild_search_index():
+    """Rebuild the full-text search index from all questions and answers."""
+    from app import search_index
+    print('%d documents indexed' % search_index.rebuild())
+
+
+def _report_seeding(table, rows, elapsed):
+    print('%-10s %10d rows in %7.1fs (%d rows/s)' %
+          (table, rows, elapsed, rows / elapsed if elapsed else rows))
+
+
+@manager.option('--seed', dest='seed', type=int, default=0)
+@manager.option('--users', dest='users', type=int, default=1000)
+@manager.option('--follows', dest='follows', type=int, default=20,
+                help='follows per user')
+@manager.option('--questions', dest='questions', type=int, default=10000)
+@manager.option('--answers', dest='answers', type=int, default=50000)
+@manager.option('--votes', dest='votes', type=int, default=200000)
+@manager.option('--comments', dest='comments', type=int, default=20000)
+@manager.option('--chunk-size', dest='chunk_size', type=int, default=10000)
+def seed(seed, users, follows, questions, answers, votes, comments, chunk_size):
+    """Bulk insert deterministic fake data and report rows/s per table."""
+    from app.seeding import Seeder
+    Role.insert_roles()
+    elapsed = Seeder(seed, chunk_size=chunk_size, report=_report_seeding).run(
+        users=users, follows=follows, questions=questions, answers=answers,
+        votes=votes, comments=comments)
+    print('done in %.1fs' % elapsed)
+    rebuild_search_index()
+    rebase_hot_scores()
+    verify_user_stats(repair=True)
+
+
+@manager.option('entity', choices=('questions', 'answers', 'votes', 'follows'))
+@manager.option('--since', dest='since', default=None,
+                help='only rows stamped after this ISO 8601 time')
+@manager.option('--since-id', dest='since_id', type=int, default=None,
+                help='only rows after this id')
+@manager.option('--output', dest='output', default=None,
+                help='file to write, standard output by default')
+def export(entity, since, since_id, output):
+    """Stream a table as newline-delimited JSON."""
+    import sys
+    from app.export import parse_since, export_rows, ndjson
+    out = open(output, 'w') if output else sys.stdout
+    try:
+        for line in ndjson(export_rows(entity, parse_since(since), since_id,
+                                       app.config['FLASK_EXPORT_CHUNK_SIZE'])):
+            out.write(line)
+    finally:
+        if output:
+            out.close()
+
+
+def benchmark_app(reseed=False):
+    """The 'benchmark' app, seeding its database on first use."""
+    from app.seeding import Seeder
+    bench_app = create_app('benchmark')
+    with bench_app.app_context():
+        if reseed:
+            db.drop_all()
+        db.create_all()
+        if User.query.count() == 0:
+            Role.insert_roles()
+            elapsed = Seeder(0, report=_report_seeding).run(
+                users=1000, follows=20, questions=10000, answers=50000,
+                votes=200000, comments=20000)
+            print('done in %.1fs' % elapsed)
+            rebuild_search_index()
+            rebase_hot_scores()
+            verify_user_stats(repair=True)
+        db.session.remove()
+    return bench_app
+
+
+@manager.option('--requests', dest='requests', type=int, default=200,
+                help='requests per route')
+@manager.option('--concurrency', dest='concurrency', type=int, default=4)
+@manager.option('--route', dest='routes', action='append',
+                help='route to benchmark, may be repeated')
+@manager.option('--anonymous', dest='anonymous', action='store_true', default=False)
+@manager.option('--reseed', dest='reseed', action='store_true', default=False,
+                help='rebuild the benchmark database')
+@manager.option('--output', dest='output', default='bench.json')
+@manager.option('--baseline', dest='baseline', default=None,
+                help='earlier results to compare against')
+def bench(requests, concurrency, routes, anonymous, reseed, output, baseline):
+    """Benchmark the main routes against a seeded SQLite dataset."""
+    from app.bench import RouteBenchmark, DEFAULT_ROUTES, compare, \
+        write_results, load_results
+    from app.seeding import SEED_PASSWORD
+    bench_app = benchmark_app(reseed)
+    results = RouteBenchmark(bench_app, routes or DEFAULT_ROUTES, requests,
+                             concurrency, anonymous).run(SEED_PASSWORD)
+    print('%-34s %8s %8s %8s %8s %6s %8s %8s' % ('route', 'p50', 'p95', 'p99',
+                                                 'req/s', 'sql', 'rows', 'objects'))
+    for route, r in sorted(results['routes'].items()):
+        print('%-34s %8.1f %8.1f %8.1f %8.1f %6.1f %8.1f %8.1f' % (
+            route, r['p50_ms'], r['p95_ms'], r['p99_ms'], r['throughput'],
+            r['statements_per_request'], r['rows_per_request'],
+            r['objects_per_request']))
+    write_results(results, output)
+    if baseline:
+        previous = load_results(baseline)
+        if previous is None:
+            print('no baseline at %s' % baseline)
+            return
+        for route, metric, old, new, change in compare(results, previous):
+            print('%-34s %-24s %10.2f -> %10.2f (%+.0f%%)' % (
+                route, metric, old, new, change * 100))
+
+
+@manager.option('--per-page', dest='per_page', type=int, default=100)
+@manager.option('--repeat', dest='repeat', type=int, default=20)
+@manager.option('--reseed', dest='reseed', action='store_true', default=False,
+                help='rebuild the benchmark database')
+def bench_serializers(per_page, repeat, reseed):
+    """Compare to_json with the column-projection API serializer."""
+    from app.bench import benchmark_serializers
+    results = benchmark_serializers(benchmark_app(reseed), per_page, repeat)
+    print('%-20s %8s %8s %6s %8s %8s %8s' % ('serializer', 'p50', 'p95', 'sql',
+                                             'rows', 'objects', 'bytes'))
+    for name in ('to_json', 'projection', 'projection+expand'):
+        r = results[name]
+        print('%-20s %8.1f %8.1f %6d %8d %8d %8d' % (
+            name, r['p50_ms'], r['p95_ms'], r['statements'], r['rows'],
+            r['objects'], r['bytes']))
+
+
 def detect():
     Role.insert_roles()
 
@@ -0,0 +1,34 @@
+""" question hot score
+
+Revision ID: 0b6e2d8c4f15
+Revises: f3b9d61a47c2
+Create Date: 2026-10-18 14:48:13.620971
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e2d8c4f15'
+down_revision = 'f3b9d61a47c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start at 0; run `manage.py rebase_hot_scores` afterwards.
+    op.create_table('score_epochs',
+                    sa.Column('name', sa.String(length=64), nullable=False),
+                    sa.Column('epoch', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('name'))
+    op.add_column('questions', sa.Column('hot_score', sa.Float(),
+                                         server_default='0', nullable=False))
+    op.create_index('ix_questions_hot_score', 'questions',
+                    ['hot_score', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_questions_hot_score', table_name='questions')
+    op.drop_column('questions', 'hot_score')
+    op.drop_table('score_epochs')
@@ -0,0 +1,30 @@
+""" answer vote_count
+
+Revision ID: 3a1f9c2e7b44
+Revises: 572cf03d86c7
+Create Date: 2026-10-18 10:02:13.114027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1f9c2e7b44'
+down_revision = '572cf03d86c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('answers', sa.Column('vote_count', sa.Integer(),
+                                       server_default='0', nullable=False))
+    op.execute('UPDATE answers SET vote_count = '
+               '(SELECT count(votes.id) FROM votes WHERE votes.answer_id = answers.id)')
+    op.create_index('ix_answers_question_id_vote_count', 'answers',
+                    ['question_id', sa.text('vote_count DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_answers_question_id_vote_count', table_name='answers')
+    op.drop_column('answers', 'vote_count')
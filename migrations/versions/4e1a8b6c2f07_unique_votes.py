@@ -0,0 +1,37 @@
+""" unique votes per answer and author
+
+Drops duplicate votes, keeping the earliest, then recomputes the counters
+that counted them and adds the unique index voting relies on. Hot scores
+still include the removed duplicates until the next
+``manage.py rebase_hot_scores``.
+
+Revision ID: 4e1a8b6c2f07
+Revises: 9c4e7f2a1d63
+Create Date: 2026-10-18 17:12:40.551903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e1a8b6c2f07'
+down_revision = '9c4e7f2a1d63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('DELETE FROM votes WHERE id NOT IN '
+               '(SELECT min(id) FROM votes GROUP BY answer_id, author_id)')
+    op.execute('UPDATE answers SET vote_count = '
+               '(SELECT count(votes.id) FROM votes WHERE votes.answer_id = answers.id)')
+    op.execute('UPDATE user_stats SET votes_received = '
+               '(SELECT count(*) FROM votes JOIN answers ON votes.answer_id = answers.id '
+               'WHERE answers.author_id = user_stats.user_id)')
+    op.create_index('ix_votes_answer_id_author_id', 'votes', ['answer_id', 'author_id'],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_votes_answer_id_author_id', table_name='votes')
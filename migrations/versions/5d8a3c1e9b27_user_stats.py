@@ -0,0 +1,45 @@
+""" user stats
+
+Revision ID: 5d8a3c1e9b27
+Revises: 0b6e2d8c4f15
+Create Date: 2026-10-18 15:21:37.904518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8a3c1e9b27'
+down_revision = '0b6e2d8c4f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('question_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('answer_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('followed_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('votes_received', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute('INSERT INTO user_stats (user_id, question_count, answer_count, '
+               'follower_count, followed_count, votes_received) '
+               'SELECT users.id, '
+               '(SELECT count(*) FROM questions WHERE questions.author_id = users.id), '
+               '(SELECT count(*) FROM answers WHERE answers.author_id = users.id), '
+               '(SELECT count(*) FROM follows WHERE follows.followed_id = users.id '
+               'AND follows.follower_id != users.id), '
+               '(SELECT count(*) FROM follows WHERE follows.follower_id = users.id '
+               'AND follows.followed_id != users.id), '
+               '(SELECT count(*) FROM votes JOIN answers ON votes.answer_id = answers.id '
+               'WHERE answers.author_id = users.id) '
+               'FROM users')
+
+
+def downgrade():
+    op.drop_table('user_stats')
@@ -0,0 +1,44 @@
+""" keyset pagination indexes
+
+Revision ID: 8d4b1e6f0a93
+Revises: 3a1f9c2e7b44
+Create Date: 2026-10-18 11:20:41.502316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4b1e6f0a93'
+down_revision = '3a1f9c2e7b44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_questions_timestamp', table_name='questions')
+    op.create_index('ix_questions_timestamp_id', 'questions',
+                    ['timestamp', 'id'], unique=False)
+    op.create_index('ix_questions_author_id_timestamp', 'questions',
+                    ['author_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_answers_author_id_timestamp', 'answers',
+                    ['author_id', 'timestamp', 'id'], unique=False)
+    op.drop_index('ix_comments_timestamp', table_name='comments')
+    op.create_index('ix_comments_timestamp_id', 'comments',
+                    ['timestamp', 'id'], unique=False)
+    op.create_index('ix_follows_followed_id_timestamp', 'follows',
+                    ['followed_id', 'timestamp', 'follower_id'], unique=False)
+    op.create_index('ix_follows_follower_id_timestamp', 'follows',
+                    ['follower_id', 'timestamp', 'followed_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_follows_follower_id_timestamp', table_name='follows')
+    op.drop_index('ix_follows_followed_id_timestamp', table_name='follows')
+    op.drop_index('ix_comments_timestamp_id', table_name='comments')
+    op.create_index('ix_comments_timestamp', 'comments', ['timestamp'], unique=False)
+    op.drop_index('ix_answers_author_id_timestamp', table_name='answers')
+    op.drop_index('ix_questions_author_id_timestamp', table_name='questions')
+    op.drop_index('ix_questions_timestamp_id', table_name='questions')
+    op.create_index('ix_questions_timestamp', 'questions', ['timestamp'], unique=False)
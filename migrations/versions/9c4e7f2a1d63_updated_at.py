@@ -0,0 +1,30 @@
+""" updated_at on questions, answers and comments, version on comments
+
+Revision ID: 9c4e7f2a1d63
+Revises: 5d8a3c1e9b27
+Create Date: 2026-10-18 16:02:11.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e7f2a1d63'
+down_revision = '5d8a3c1e9b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('questions', 'answers', 'comments'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute('UPDATE %s SET updated_at = timestamp' % table)
+    op.add_column('comments', sa.Column('version', sa.Integer(), server_default='1',
+                                        nullable=False))
+
+
+def downgrade():
+    op.drop_column('comments', 'version')
+    for table in ('comments', 'answers', 'questions'):
+        op.drop_column(table, 'updated_at')
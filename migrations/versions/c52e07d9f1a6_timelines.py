@@ -0,0 +1,40 @@
+""" timelines
+
+Revision ID: c52e07d9f1a6
+Revises: 8d4b1e6f0a93
+Create Date: 2026-10-18 12:05:37.880121
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e07d9f1a6'
+down_revision = '8d4b1e6f0a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timelines',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'question_id')
+    )
+    op.create_index('ix_timelines_user_id_timestamp', 'timelines',
+                    ['user_id', 'timestamp', 'question_id'], unique=False)
+    op.execute('INSERT INTO timelines (user_id, question_id, author_id, timestamp) '
+               'SELECT follows.follower_id, questions.id, questions.author_id, '
+               'questions.timestamp FROM follows JOIN questions '
+               'ON follows.followed_id = questions.author_id')
+
+
+def downgrade():
+    op.drop_index('ix_timelines_user_id_timestamp', table_name='timelines')
+    op.drop_table('timelines')
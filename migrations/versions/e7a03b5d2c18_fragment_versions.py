@@ -0,0 +1,28 @@
+""" question and answer versions
+
+Revision ID: e7a03b5d2c18
+Revises: c52e07d9f1a6
+Create Date: 2026-10-18 13:12:09.431877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a03b5d2c18'
+down_revision = 'c52e07d9f1a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('questions', sa.Column('version', sa.Integer(),
+                                         server_default='1', nullable=False))
+    op.add_column('answers', sa.Column('version', sa.Integer(),
+                                       server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('answers', 'version')
+    op.drop_column('questions', 'version')
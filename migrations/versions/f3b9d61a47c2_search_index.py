@@ -0,0 +1,29 @@
+""" full-text search index
+
+Revision ID: f3b9d61a47c2
+Revises: e7a03b5d2c18
+Create Date: 2026-10-18 14:02:51.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d61a47c2'
+down_revision = 'e7a03b5d2c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite only; run `manage.py rebuild_search_index` afterwards
+    # to fill the index from existing rows.
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                   "title, body, question_id UNINDEXED, tokenize='unicode61')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS search_index')
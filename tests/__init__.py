@@ -1 +1,4 @@
-from . import test_basics, test_user_model
\ No newline at end of file
+from . import test_basics, test_user_model, test_answer_model, test_pagination, test_timeline, test_email, \
+    test_nplusone, test_search, test_follow_graph, test_user_stats, \
+    test_api, test_seeding, test_page_cache, test_presence, test_rendering, \
+    test_fragments, test_identity, test_bench, test_metrics
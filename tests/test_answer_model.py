@@ -0,0 +1,163 @@
+import signal
+import unittest
+from sqlalchemy.exc import OperationalError
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Role, Question, Answer, Vote
+
+
+class AnswerModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_vote_count(self):
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        q = Question(title='t', body='b', author=u1)
+        a = Answer(body='a', question=q, author=u1)
+        db.session.add_all([u1, u2, q, a])
+        db.session.commit()
+        self.assertEqual(a.vote_count, 0)
+        v1 = Vote(answer=a, author=u1)
+        v2 = Vote(answer=a, author=u2)
+        db.session.add_all([v1, v2])
+        db.session.commit()
+        self.assertEqual(a.vote_count, 2)
+        db.session.delete(v1)
+        db.session.commit()
+        self.assertEqual(a.vote_count, 1)
+
+    def test_rebuild_vote_counts(self):
+        u = User(email='john@example.com', password='cat')
+        q = Question(title='t', body='b', author=u)
+        a1 = Answer(body='a', question=q, author=u)
+        a2 = Answer(body='b', question=q, author=u)
+        db.session.add_all([u, q, a1, a2, Vote(answer=a2, author=u)])
+        db.session.commit()
+        a1.vote_count = 5
+        db.session.commit()
+        Answer.rebuild_vote_counts()
+        self.assertEqual(a1.vote_count, 0)
+        self.assertEqual(a2.vote_count, 1)
+        self.assertEqual(q.top_answers(2), [a2.id, a1.id])
+
+    def test_load_top_answers(self):
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        q1 = Question(title='t1', body='b', author=u1)
+        q2 = Question(title='t2', body='b', author=u1)
+        q3 = Question(title='t3', body='b', author=u1)
+        a1 = Answer(body='a', question=q1, author=u1)
+        a2 = Answer(body='b', question=q1, author=u2)
+        a3 = Answer(body='c', question=q1, author=u2)
+        a4 = Answer(body='d', question=q2, author=u1)
+        db.session.add_all([u1, u2, q1, q2, q3, a1, a2, a3, a4,
+                            Vote(answer=a2, author=u1),
+                            Vote(answer=a2, author=u2),
+                            Vote(answer=a3, author=u1)])
+        db.session.commit()
+        top = Question.load_top_answers([q1.id, q2.id, q3.id], 2)
+        self.assertEqual(top[q1.id], [a2, a3])
+        self.assertEqual(top[q2.id], [a4])
+        self.assertEqual(top[q3.id], [])
+
+    def test_hot_score(self):
+        u = User(email='john@example.com', password='cat')
+        old = Question(title='t1', body='b', author=u,
+                       timestamp=datetime.utcnow() - timedelta(days=1))
+        new = Question(title='t2', body='b', author=u)
+        db.session.add_all([u, old, new])
+        db.session.commit()
+        self.assertAlmostEqual(new.hot_score / old.hot_score, 2.0, places=3)
+
+        a = Answer(body='a', question=old, author=u)
+        db.session.add_all([a, Vote(answer=a, author=u)])
+        db.session.commit()
+        self.assertGreater(old.hot_score, new.hot_score)
+        ranked = Question.query.order_by(Question.hot_score.desc()).all()
+        self.assertEqual(ranked, [old, new])
+
+        scores = (old.hot_score, new.hot_score)
+        Question.rebase_hot_scores()
+        self.assertAlmostEqual(old.hot_score / new.hot_score, scores[0] / scores[1])
+
+        # years without a rebase are clamped instead of overflowing
+        far = Question(title='t3', body='b', author=u,
+                       timestamp=datetime.utcnow() + timedelta(days=3650))
+        db.session.add(far)
+        db.session.commit()
+        self.assertLess(far.hot_score, float('inf'))
+
+    def test_cast_votes(self):
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        q = Question(title='t', body='b', author=u1)
+        a1 = Answer(body='a', question=q, author=u1)
+        a2 = Answer(body='b', question=q, author=u2)
+        db.session.add_all([u1, u2, q, a1, a2])
+        db.session.commit()
+        self.assertEqual(sorted(Vote.cast(u2.id, [a1.id, a2.id, a1.id])), [a1.id, a2.id])
+        self.assertEqual(Vote.cast(u2.id, [a1.id, a2.id + 100]), [])
+        db.session.expire_all()
+        self.assertEqual((a1.vote_count, a2.vote_count), (1, 1))
+        self.assertEqual(u1.stats.votes_received, 1)
+        self.assertEqual(Vote.query.count(), 2)
+
+    def test_vote_buffer(self):
+        from app import vote_buffer
+        self.app.config['FLASK_VOTE_FLUSH_INTERVAL'] = 60
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        q = Question(title='t', body='b', author=u1)
+        a = Answer(body='a', question=q, author=u1)
+        db.session.add_all([u1, u2, q, a])
+        db.session.commit()
+        self.assertTrue(vote_buffer.add(u1.id, a.id))
+        self.assertTrue(vote_buffer.add(u2.id, a.id))
+        self.assertFalse(vote_buffer.add(u2.id, a.id))
+        self.assertTrue(vote_buffer.add(u2.id, a.id + 100))
+        self.assertEqual((a.vote_count, vote_buffer.pending(a.id)), (0, 2))
+        self.assertEqual(vote_buffer.flush(), 2)
+        db.session.expire_all()
+        self.assertEqual((a.vote_count, vote_buffer.pending(a.id)), (2, 0))
+        self.assertEqual(vote_buffer.pending(a.id + 100), 0)
+
+        # a vote that is already stored is refused rather than counted again
+        self.assertFalse(vote_buffer.add(u2.id, a.id))
+        self.assertEqual(vote_buffer.pending(a.id), 0)
+
+        # a locked database keeps the batch pending for the next flush
+        def locked(connection, votes):
+            raise OperationalError('INSERT', {}, Exception('database is locked'))
+        a2 = Answer(body='b', question=q, author=u2)
+        db.session.add(a2)
+        db.session.commit()
+        self.assertTrue(vote_buffer.add(u1.id, a2.id))
+        insert_votes = Vote.__dict__['insert_votes']
+        Vote.insert_votes = staticmethod(locked)
+        try:
+            self.assertEqual(vote_buffer.flush(), 0)
+        finally:
+            Vote.insert_votes = insert_votes
+        self.assertEqual(vote_buffer.pending(a2.id), 1)
+        self.assertFalse(vote_buffer.add(u1.id, a2.id))
+        self.assertEqual(vote_buffer.flush(), 1)
+        db.session.expire_all()
+        self.assertEqual((a2.vote_count, vote_buffer.pending(a2.id)), (1, 0))
+        vote_buffer.shutdown(self.app)
+
+    def test_sigterm_exits_through_atexit(self):
+        handler = signal.getsignal(signal.SIGTERM)
+        self.assertNotEqual(handler, signal.SIG_DFL)
+        with self.assertRaises(SystemExit) as exit:
+            handler(signal.SIGTERM, None)
+        self.assertEqual(exit.exception.code, 128 + signal.SIGTERM)
@@ -0,0 +1,177 @@
+import unittest
+import json
+from base64 import b64encode
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Role, Question, Answer, Comment, Vote
+
+
+class APITestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get_raw(self, url, **headers):
+        headers['Authorization'] = 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')
+        return self.client.get(url, headers=headers, base_url='https://localhost')
+
+    def get(self, url):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = self.get_raw(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        return response, json.loads(response.get_data(as_text=True)), len(statements)
+
+    def test_batch_and_expand(self):
+        users = [User(email='john@example.com', username='john', password='cat',
+                      confirmed=True)] + \
+            [User(email='user%d@example.com' % i, username='user%d' % i, password='cat')
+             for i in range(4)]
+        questions = [Question(title='t%d' % i, body='b', author=users[i]) for i in range(4)]
+        answers = [Answer(body='a', question=q, author=u) for q in questions for u in users]
+        db.session.add_all(users + questions + answers +
+                           [Comment(body='c', answer=answers[0], author=users[1])])
+        db.session.commit()
+        ids = [q.id for q in questions]
+
+        response, json_response, _ = self.get('/api/v1.0/questions/?ids=%d,%d,0'
+                                              % (ids[2], ids[0]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q['title'] for q in json_response['questions']], ['t2', 't0'])
+        self.assertEqual(json_response['questions'][0]['answer_count'], 5)
+
+        url = '/api/v1.0/questions/?expand=author,top_answers&ids='
+        _, json_response, few = self.get(url + '%d' % ids[0])
+        question = json_response['questions'][0]
+        self.assertEqual(question['author']['username'], users[0].username)
+        self.assertEqual(len(question['top_answers']), 3)
+        self.assertEqual(question['top_answers'][0]['comment_count'], 1)
+        self.assertIn('username', question['top_answers'][0]['author'])
+        _, json_response, many = self.get(url + ','.join(map(str, ids)))
+        self.assertEqual(len(json_response['questions']), 4)
+        self.assertEqual(few, many)
+
+        _, json_response, _ = self.get('/api/v1.0/users/?ids=%d,%d'
+                                       % (users[3].id, users[1].id))
+        self.assertEqual([u['username'] for u in json_response['users']],
+                         [users[3].username, users[1].username])
+        self.assertEqual(self.get('/api/v1.0/questions/?expand=votes')[0].status_code, 400)
+
+    def test_projection_matches_to_json(self):
+        from app.api_0_1.serializers import questions_by_id, questions_json, users_json
+        u = User(email='john@example.com', username='john', password='cat')
+        q = Question(title='t', body='*b*', author=u)
+        db.session.add_all([u, q, Answer(body='a', question=q, author=u)])
+        db.session.commit()
+        with self.app.test_request_context(base_url='https://localhost'):
+            self.assertEqual(questions_json(questions_by_id([q.id])), [q.to_json()])
+            self.assertEqual(users_json([u.id]), [u.to_json()])
+
+    def test_export(self):
+        admin = User(email='john@example.com', username='john', password='cat',
+                     confirmed=True, role=Role.query.filter_by(name='Administrator').first())
+        q = Question(title='t', body='b', author=admin)
+        db.session.add_all([admin, q] + [Answer(body='a%d' % i, question=q, author=admin)
+                                         for i in range(3)])
+        db.session.commit()
+        response = self.get_raw('/api/v1.0/export/answers?since_id=1')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['body'] for row in rows], ['a1', 'a2'])
+
+        # pages resume after the last key, including composite follow keys
+        from app.export import export_rows
+        users = [User(email='u%d@example.com' % i, password='cat') for i in range(3)]
+        db.session.add_all(users)
+        db.session.commit()
+        for follower in [admin] + users:
+            for followed in [admin] + users:
+                follower.follow(followed)
+        rows = list(export_rows('follows', chunk_size=3))
+        keys = [(row['follower_id'], row['followed_id']) for row in rows]
+        self.assertEqual(keys, sorted(set(keys)))
+        self.assertEqual(len(keys), 16)
+        self.assertEqual([row['body'] for row in export_rows('answers', chunk_size=1)],
+                         ['a0', 'a1', 'a2'])
+
+    def test_conditional_get(self):
+        u = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        q = Question(title='t', body='b', author=u)
+        db.session.add_all([u, q])
+        db.session.commit()
+        url = '/api/v1.0/questions/%d' % q.id
+        etag = self.get_raw(url).headers['ETag']
+        self.assertEqual(self.get_raw(url, **{'If-None-Match': etag}).status_code, 304)
+        db.session.add(Answer(body='a', question=q, author=u))
+        db.session.commit()
+        self.assertNotEqual(self.get_raw(url).headers['ETag'], etag)
+
+    def test_cached_credentials_follow_email_change(self):
+        u = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        db.session.add(u)
+        db.session.commit()
+        self.assertEqual(self.get_raw('/api/v1.0/questions/').status_code, 200)
+        u.email = 'johnny@example.com'
+        db.session.commit()
+        self.assertEqual(self.get_raw('/api/v1.0/questions/').status_code, 401)
+
+    def test_conditional_get_sees_pending_votes(self):
+        from app import vote_buffer
+        self.app.config['FLASK_VOTE_FLUSH_INTERVAL'] = 60
+        u = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        a = Answer(body='a', question=Question(title='t', body='b', author=u), author=u)
+        db.session.add_all([u, a])
+        db.session.commit()
+        url = '/api/v1.0/answers/%d' % a.id
+        etag = self.get_raw(url).headers['ETag']
+        vote_buffer.add(u.id, a.id)
+        response = self.get_raw(url, **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data(as_text=True))['vote_count'], 1)
+        vote_buffer.shutdown(self.app)
+
+    def test_post_votes_checks_stored_votes_once(self):
+        from app import vote_buffer
+        self.app.config['FLASK_VOTE_FLUSH_INTERVAL'] = 60
+        u = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        q = Question(title='t', body='b', author=u)
+        answers = [Answer(body='a%d' % i, question=q, author=u) for i in range(10)]
+        db.session.add_all([u, q] + answers)
+        db.session.commit()
+        Vote.cast(u.id, [answers[0].id])
+        headers = {'Authorization': 'Basic ' + b64encode(b'john@example.com:cat').decode('utf-8')}
+        counts = []
+        # the first request also caches the credentials
+        for ids in ([answers[0].id], [answers[0].id, answers[1].id],
+                    [a.id for a in answers]):
+            statements = []
+
+            def count(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                response = self.client.post('/api/v1.0/votes/', headers=headers,
+                                            base_url='https://localhost',
+                                            data=json.dumps({'answer_ids': ids}),
+                                            content_type='application/json')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+            counts.append(len(statements))
+        body = json.loads(response.get_data(as_text=True))
+        self.assertEqual(body['accepted'], sorted(a.id for a in answers[2:]))
+        self.assertEqual(counts[1], counts[2])
+        vote_buffer.flush()
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+from app import create_app, db
+from app.bench import percentile, compare, write_results, load_results, RouteBenchmark, \
+    QueryCounter
+from app.models import User, Role, Question
+
+
+class BenchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_results_round_trip_and_compare(self):
+        baseline = {'routes': {'/': {'p50_ms': 10.0, 'throughput': 100.0},
+                               '/gone': {'p50_ms': 1.0}}}
+        results = {'routes': {'/': {'p50_ms': 15.0, 'throughput': 50.0},
+                              '/new': {'p50_ms': 1.0}}}
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'bench.json')
+        self.assertIsNone(load_results(path))
+        write_results(baseline, path)
+        self.assertEqual(sorted(compare(results, load_results(path))),
+                         [('/', 'p50_ms', 10.0, 15.0, 0.5),
+                          ('/', 'throughput', 100.0, 50.0, -0.5)])
+
+    def test_query_counter_counts_projection_rows(self):
+        u = User(email='john@example.com', username='john', password='cat')
+        db.session.add_all([u, Question(title='a', body='b', author=u),
+                            Question(title='c', body='d', author=u)])
+        db.session.commit()
+        db.session.remove()
+        with QueryCounter(db.get_engine(self.app)) as counter:
+            counter.reset()
+            db.session.query(Question.id, Question.title).all()
+            self.assertEqual(counter.read(), (1, 2, 0))
+            counter.reset()
+            Question.query.all()
+            self.assertEqual(counter.read(), (1, 2, 2))
+
+    def test_route_benchmark(self):
+        u = User(email='john@example.com', username='john', password='cat', confirmed=True)
+        db.session.add_all([u, Question(title='t', body='b', author=u)])
+        db.session.commit()
+        results = RouteBenchmark(self.app, routes=('/question/<question>',
+                                                   '/api/v1.0/questions/<question>'),
+                                 requests=4, concurrency=2).run('cat')
+        for route, stats in results['routes'].items():
+            self.assertEqual(stats['requests'], 4, route)
+            self.assertEqual(stats['statuses'], {'200': 4}, route)
+            self.assertGreater(stats['statements_per_request'], 0, route)
+            self.assertIsNotNone(stats['p95_ms'], route)
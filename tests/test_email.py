@@ -0,0 +1,72 @@
+import asyncore
+import smtpd
+import threading
+import unittest
+from flask_mail import Message
+from app import create_app, mail
+from app.email import mail_queue
+
+
+class RecordingSMTPServer(smtpd.SMTPServer):
+    def __init__(self, *args, **kwargs):
+        smtpd.SMTPServer.__init__(self, *args, **kwargs)
+        self.messages = []
+        self.rejected = []
+        self.connections = 0
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if 'rejected@example.com' in rcpttos:
+            self.rejected.append(rcpttos)
+            return '550 mailbox unavailable'
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+class MailQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = RecordingSMTPServer(('127.0.0.1', 0), None)
+        self.server_thread = threading.Thread(
+            target=asyncore.loop, kwargs={'timeout': 0.05})
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.app = create_app('testing')
+        self.app.config.update(MAIL_SERVER='127.0.0.1',
+                               MAIL_PORT=self.server.socket.getsockname()[1],
+                               MAIL_USE_SSL=False, MAIL_USE_TLS=False,
+                               MAIL_USERNAME=None, MAIL_SUPPRESS_SEND=False)
+        mail.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app.extensions['mail_queue'].shutdown()
+        self.app_context.pop()
+        self.server.close()
+        self.server_thread.join()
+
+    def test_batches_share_connections(self):
+        for i in range(10):
+            msg = Message('hello %d' % i, sender='from@example.com',
+                          recipients=['to%d@example.com' % i], body='body')
+            self.assertTrue(mail_queue.send(msg))
+        self.app.extensions['mail_queue'].shutdown()
+        self.assertEqual(len(self.server.messages), 10)
+        self.assertTrue(self.server.connections <=
+                        self.app.config['FLASK_MAIL_WORKERS'])
+
+    def test_failed_mail_is_skipped(self):
+        messages = [Message('rejected', sender='from@example.com',
+                            recipients=['rejected@example.com'], body='body'),
+                    Message('no sender', recipients=['to@example.com'], body='body'),
+                    Message('hello', sender='from@example.com',
+                            recipients=['to@example.com'], body='body')]
+        self.app.logger.disabled = True
+        for msg in messages:
+            self.assertTrue(mail_queue.send(msg))
+        self.app.extensions['mail_queue'].shutdown()
+        # the permanent 550 is not retried and neither failure stops the worker
+        self.assertEqual(len(self.server.rejected), 1)
+        self.assertEqual(len(self.server.messages), 1)
@@ -0,0 +1,83 @@
+import unittest
+from app import create_app, db, follow_graph
+from app.models import User, Role, Follow
+
+
+class FollowGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_follow_sync_and_suggestions(self):
+        a, b, c, d = [User(email='%s@example.com' % name, username=name, password='p')
+                      for name in 'abcd']
+        db.session.add_all([a, b, c, d])
+        db.session.commit()
+        a.follow(b)
+        a.follow(c)
+        b.follow(d)
+        c.follow(d)
+        c.follow(b)
+        self.assertTrue(a.is_following(b))
+        self.assertTrue(b.is_followed_by(a))
+        self.assertFalse(b.is_following(a))
+        self.assertEqual(list(follow_graph.followers(d.id)), [b.id, c.id, d.id])
+        self.assertEqual(list(follow_graph.following(a.id)), [a.id, b.id, c.id])
+        self.assertEqual([(u.username, n) for u, n in a.suggested_users()], [('d', 2)])
+
+        a.unfollow(c)
+        self.assertFalse(a.is_following(c))
+        self.assertEqual([(u.username, n) for u, n in a.suggested_users()], [('d', 1)])
+
+        db.session.execute(Follow.__table__.insert().values(follower_id=d.id,
+                                                            followed_id=a.id))
+        db.session.commit()
+        self.assertFalse(d.is_following(a))
+        d.follow(a)
+        follow_graph.load()
+        self.assertTrue(d.is_following(a))
+
+    def test_stale_graph_reloads_in_background(self):
+        a, b = [User(email='%s@example.com' % name, username=name, password='p')
+                for name in 'ab']
+        db.session.add_all([a, b])
+        db.session.commit()
+        follow_graph.graph().loaded_at = 0
+        db.session.execute(Follow.__table__.insert().values(follower_id=a.id,
+                                                            followed_id=b.id))
+        db.session.commit()
+        self.assertFalse(a.is_following(b))
+        reloader = self.app.extensions['follow_graph']['reloader']
+        if reloader is not None:
+            reloader.join()
+        self.assertTrue(a.is_following(b))
+
+    def test_follows_committed_during_reload_are_replayed(self):
+        a, b, c = [User(email='%s@example.com' % name, username=name, password='p')
+                   for name in 'abc']
+        db.session.add_all([a, b, c])
+        db.session.commit()
+        a.follow(b)
+        read = follow_graph._read
+
+        def read_then_commit(*args):
+            graph = read(*args)
+            a.follow(c)
+            a.unfollow(b)
+            return graph
+        follow_graph._read = read_then_commit
+        try:
+            follow_graph.load()
+        finally:
+            del follow_graph._read
+        self.assertTrue(a.is_following(c))
+        self.assertFalse(a.is_following(b))
+        self.assertEqual(self.app.extensions['follow_graph']['replays'], [])
@@ -0,0 +1,60 @@
+# This Python file uses the following encoding: utf-8
+import unittest
+from sqlalchemy import event
+from app import create_app, db, fragment_cache
+from app.models import User, Role, Question, Answer, Vote
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(email='john@example.com', username='john', password='cat')
+        self.answer = Answer(body='a', author=self.user,
+                             question=Question(title='t', body='b', author=self.user))
+        db.session.add_all([self.user, self.answer])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def render(self, controls=u'', pending_votes=0):
+        with self.app.test_request_context('/'):
+            return fragment_cache.render('_answers_no_loop.html', answer=self.answer,
+                                         controls=controls, pending_votes=pending_votes)
+
+    def test_key_follows_version_and_pending_votes(self):
+        key = fragment_cache.key('_answers_no_loop.html', {'answer': self.answer})
+        self.assertEqual(key[1], ('answer', ('answers', self.answer.id, self.answer.version)))
+        self.assertIn(u'点赞(0)', self.render())
+        self.assertIn(u'点赞(2)', self.render(pending_votes=2))
+
+        db.session.add(Vote(answer=self.answer, author=self.user))
+        db.session.commit()
+        self.assertIn(u'点赞(1)', self.render())
+
+    def test_controls_are_not_cached(self):
+        self.assertIn(u'<b>edit</b>', self.render(controls=u'<b>edit</b>'))
+        self.assertNotIn(u'<b>edit</b>', self.render())
+
+    def test_question_cards_take_answer_counts_from_the_view(self):
+        questions = [Question(title='q%d' % i, body='b', author=self.user) for i in range(3)]
+        db.session.add_all(questions + [Answer(body='a', author=self.user, question=q)
+                                        for q in questions])
+        db.session.commit()
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = self.app.test_client().get('/square', base_url='https://localhost')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(response.get_data(as_text=True).count(u'全部回答[1]'), 4)
+        self.assertEqual([s for s in statements if 'count(*)' in s], [])
@@ -0,0 +1,57 @@
+import unittest
+from sqlalchemy import event
+from app import create_app, db, identity_cache
+from app.models import User, Role, Permission
+
+
+class IdentityCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def statements(self, f, *args):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            result = f(*args)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        return result, len(statements)
+
+    def test_user_cache_invalidated_on_commit(self):
+        u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        identity_cache.load_user(u.id)
+        db.session.expunge_all()
+        user, statements = self.statements(identity_cache.load_user, str(u.id))
+        self.assertEqual((user.username, statements), ('john', 0))
+
+        user.username = 'johnny'
+        db.session.commit()
+        db.session.expunge_all()
+        self.assertEqual(identity_cache.load_user(u.id).username, 'johnny')
+
+    def test_role_permissions_invalidated_on_commit(self):
+        role = Role.query.filter_by(name='User').first()
+        u = User(email='john@example.com', password='cat', role=role)
+        db.session.add(u)
+        db.session.commit()
+        self.assertTrue(u.can(Permission.COMMENT))
+        _, statements = self.statements(u.can, Permission.COMMENT)
+        self.assertEqual(statements, 0)
+
+        role.permission &= ~Permission.COMMENT
+        db.session.commit()
+        self.assertFalse(u.can(Permission.COMMENT))
@@ -0,0 +1,64 @@
+import threading
+import unittest
+from app import create_app, db
+from app.metrics import _Registry
+from app.models import User, Role
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login(self, role):
+        db.session.add(User(email='john@example.com', username='john', password='cat',
+                            confirmed=True, role=Role.query.filter_by(name=role).first()))
+        db.session.commit()
+        self.client.post('/auth/login', base_url='https://localhost',
+                         data={'email': 'john@example.com', 'password': 'cat'})
+
+    def get(self, url):
+        return self.client.get(url, base_url='https://localhost')
+
+    def test_export(self):
+        self.login('Administrator')
+        for i in range(3):
+            self.assertEqual(self.get('/square').status_code, 200)
+        response = self.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('flask_requests_total{endpoint="main.square",status="200"} 3', text)
+        self.assertIn('flask_request_duration_seconds_count{endpoint="main.square"} 3', text)
+        self.assertIn('flask_request_duration_seconds_bucket{endpoint="main.square",'
+                      'le="+Inf"} 3', text)
+        self.assertIn('flask_cache_hits_total{cache="render"}', text)
+
+    def test_admin_only(self):
+        self.login('User')
+        self.assertEqual(self.get('/metrics').status_code, 403)
+
+    def test_shards_of_finished_threads_are_retired(self):
+        registry = _Registry((0.1, 1.0))
+        for i in range(5):
+            thread = threading.Thread(target=registry.record,
+                                      args=('main.index', 200, 0.05, 1, 0.01, 0.0))
+            thread.start()
+            thread.join()
+        registry.record('main.index', 500, 0.5, 2, 0.02, 0.0)
+        stats = registry.merged()['main.index']
+        self.assertEqual((stats.count, stats.sql_count), (6, 7))
+        self.assertEqual(stats.statuses, {200: 5, 500: 1})
+        self.assertEqual(stats.buckets, [5, 1, 0])
+        self.assertEqual(len(registry._shards), 1)
+        self.assertEqual(registry.merged()['main.index'].count, 6)
@@ -0,0 +1,45 @@
+import unittest
+from flask import render_template_string
+from app import create_app, db
+from app.exceptions import NPlusOneError
+from app.models import User, Role, Question
+from app.nplusone import normalize
+
+
+class NPlusOneTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASK_NPLUSONE_THRESHOLD'] = 2
+        self.app.config['FLASK_NPLUSONE_RAISE'] = True
+
+        @self.app.route('/titles')
+        def titles():
+            return render_template_string(
+                '{% for q in questions %}{{ q.author.username }}{% endfor %}',
+                questions=Question.query.all())
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT * FROM users\n WHERE id = 12 AND name = 'a''b' "
+                      "AND role_id IN (?, ?, ?)"),
+            'SELECT * FROM users WHERE id = ? AND name = ? AND role_id IN (?)')
+
+    def test_lazy_loads_in_template_fail_request(self):
+        for i in range(4):
+            u = User(email='u%d@example.com' % i, username='u%d' % i, password='p')
+            db.session.add(Question(title='t', body='b', author=u))
+        db.session.commit()
+        db.session.expire_all()
+        client = self.app.test_client()
+        with self.assertRaises(NPlusOneError):
+            client.get('/titles', base_url='https://localhost')
@@ -0,0 +1,55 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Question
+
+
+class PageCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.client = self.app.test_client()
+        self.user = User(email='john@example.com', username='john', password='cat')
+        self.question = Question(title='first', body='b', author=self.user)
+        db.session.add_all([self.user, self.question])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get(self, **headers):
+        return self.client.get('/trending', headers=headers, base_url='https://localhost')
+
+    def rename(self, title):
+        # a write this process's cache never hears about, as if from another worker
+        questions = Question.__table__
+        db.session.execute(questions.update().where(questions.c.id == self.question.id)
+                           .values(title=title, version=questions.c.version + 1))
+        db.session.commit()
+
+    def test_commit_invalidates(self):
+        response = self.get()
+        etag = response.headers['ETag']
+        self.assertEqual(self.get(**{'If-None-Match': etag}).status_code, 304)
+        self.rename('unseen')
+        self.assertEqual(self.get(**{'If-None-Match': etag}).status_code, 304)
+        db.session.add(Question(title='second', body='b', author=self.user))
+        db.session.commit()
+        response = self.get(**{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'second', response.get_data())
+
+    def test_last_modified_follows_content(self):
+        self.app.config['FLASK_PAGE_CACHE_TIMEOUT'] = 0
+        response = self.get()
+        last_modified = response.headers['Last-Modified']
+        self.assertEqual(self.get(**{'If-Modified-Since': last_modified}).status_code, 304)
+        self.rename('renamed')
+        response = self.get(**{'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'renamed', response.get_data())
+        self.assertNotEqual(response.headers['Last-Modified'], last_modified)
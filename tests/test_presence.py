@@ -0,0 +1,45 @@
+import time
+import unittest
+from app import create_app, db, last_seen_buffer
+from app.models import User, Role
+
+
+class LastSeenBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.user = User(email='john@example.com', password='cat')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def stored_last_seen(self):
+        db.session.expire_all()
+        return self.user.last_seen
+
+    def test_ping_within_min_interval_is_ignored(self):
+        self.app.config['FLASK_LAST_SEEN_MIN_INTERVAL'] = 60
+        self.user.ping()
+        first = self.stored_last_seen()
+        self.user.ping()
+        self.assertEqual(self.stored_last_seen(), first)
+
+    def test_pending_pings_are_flushed_without_traffic(self):
+        self.app.config.update(FLASK_LAST_SEEN_FLUSH_INTERVAL=0.5,
+                               FLASK_LAST_SEEN_MIN_INTERVAL=0)
+        last_seen_buffer.flush()
+        before = self.stored_last_seen()
+        self.user.ping()
+        self.assertEqual(self.stored_last_seen(), before)
+        deadline = time.time() + 5
+        while self.stored_last_seen() == before and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertGreater(self.stored_last_seen(), before)
+        self.app.config['FLASK_LAST_SEEN_FLUSH_INTERVAL'] = 0
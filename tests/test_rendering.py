@@ -0,0 +1,30 @@
+import unittest
+from app.cache import LRUCache
+from app.rendering import BodyRenderer
+
+
+class BodyRendererTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(100)
+
+    def test_cached_per_text(self):
+        renderer = BodyRenderer(['p', 'em'], cache=self.cache)
+        self.assertEqual(renderer.render(u'*a*'), u'<p><em>a</em></p>')
+        self.assertEqual(renderer.render(u'*a*'), u'<p><em>a</em></p>')
+        self.assertEqual((self.cache.misses, self.cache.hits), (1, 1))
+        self.assertNotEqual(renderer.key(u'*a*'), renderer.key(u'*b*'))
+        self.assertIsNone(renderer.render(None))
+
+    def test_whitelist_change_is_a_new_version(self):
+        strict = BodyRenderer(['p'], cache=self.cache)
+        loose = BodyRenderer(['em', 'p'], cache=self.cache)
+        self.assertEqual(BodyRenderer(['p', 'em']).version, loose.version)
+        self.assertNotEqual(strict.key(u'*a*'), loose.key(u'*a*'))
+        self.assertEqual(strict.render(u'*a*'), u'<p>a</p>')
+        self.assertEqual(loose.render(u'*a*'), u'<p><em>a</em></p>')
+
+    def test_render_many_converts_each_text_once(self):
+        renderer = BodyRenderer(['p'], cache=self.cache)
+        self.assertEqual(renderer.render_many([u'x', u'y', u'x']),
+                         [u'<p>x</p>', u'<p>y</p>', u'<p>x</p>'])
+        self.assertEqual(self.cache.misses, 2)
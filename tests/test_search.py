@@ -0,0 +1,44 @@
+# This Python file uses the following encoding: utf-8
+import unittest
+from app import create_app, db, search_index
+from app.models import User, Role, Question, Answer
+
+
+class SearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_index_follows_edits(self):
+        u = User(email='john@example.com', password='cat')
+        q = Question(title=u'如何学习 Python', body=u'有什么<b>建议</b>？', author=u)
+        a = Answer(body=u'阅读 Flask 源码', question=q, author=u)
+        db.session.add_all([u, q, a])
+        db.session.commit()
+
+        results = search_index.search(u'学习').items
+        self.assertEqual([(r.kind, r.id) for r in results], [('question', q.id)])
+        self.assertIn(u'<mark>学习</mark>', results[0].snippet)
+        self.assertEqual(search_index.search(u'习学').total, 0)
+        self.assertIn(u'&lt;b&gt;', search_index.search(u'建议').items[0].snippet)
+
+        result = search_index.search(u'Flask 源码').items[0]
+        self.assertEqual((result.kind, result.id, result.question), ('answer', a.id, q))
+
+        q.body = u'Django'
+        db.session.delete(a)
+        db.session.commit()
+        self.assertEqual(search_index.search(u'建议').total, 0)
+        self.assertEqual(search_index.search(u'django').total, 1)
+        self.assertEqual(search_index.search(u'Flask').total, 0)
+
+        self.assertEqual(search_index.rebuild(), 1)
+        self.assertEqual(search_index.search(u'python').total, 1)
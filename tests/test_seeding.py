@@ -0,0 +1,37 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Follow, Question, Answer, Vote
+from app.seeding import Seeder
+
+
+class SeederTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def seed(self, **counts):
+        Seeder(0, chunk_size=7).run(**counts)
+
+    def test_seed_existing_database(self):
+        counts = dict(users=10, follows=5, questions=5, answers=20, votes=60, comments=10)
+        self.seed(**counts)
+        self.seed(**counts)
+        self.assertEqual(User.query.count(), 20)
+        self.assertEqual(Question.query.count(), 10)
+        self.assertEqual(db.session.query(db.func.sum(Answer.vote_count)).scalar(),
+                         Vote.query.count())
+        # more than the self-follows that users() adds
+        self.assertGreater(Follow.query.count(), 20)
+
+    def test_seed_without_users(self):
+        self.seed(questions=5, answers=5, votes=5, comments=5)
+        self.assertEqual(Question.query.count(), 0)
+        self.assertEqual(Answer.query.count(), 0)
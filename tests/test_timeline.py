@@ -0,0 +1,53 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Question, Timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_fan_out_and_follow_sync(self):
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        db.session.add_all([u1, u2])
+        db.session.commit()
+        q1 = Question(title='t1', body='b', author=u2)
+        db.session.add(q1)
+        db.session.commit()
+        self.assertEqual(u2.followed_questions.all(), [q1])
+        self.assertFalse(u1.has_followed_questions())
+
+        u1.follow(u2)
+        self.assertEqual(u1.followed_questions.all(), [q1])
+        q2 = Question(title='t2', body='b', author=u2)
+        db.session.add(q2)
+        db.session.commit()
+        self.assertEqual(u1.followed_questions.count(), 2)
+
+        u1.unfollow(u2)
+        self.assertFalse(u1.has_followed_questions())
+        self.assertEqual(u2.followed_questions.count(), 2)
+
+    def test_rebuild(self):
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        db.session.add_all([u1, u2])
+        db.session.commit()
+        u1.follow(u2)
+        db.session.add(Question(title='t1', body='b', author=u2))
+        db.session.commit()
+        before = sorted((t.user_id, t.question_id) for t in Timeline.query)
+        Timeline.rebuild()
+        after = sorted((t.user_id, t.question_id) for t in Timeline.query)
+        self.assertEqual(before, after)
+        self.assertEqual(len(after), 2)
@@ -0,0 +1,53 @@
+import unittest
+from app import create_app, db
+from app.models import User, Role, Question, Answer, Vote, UserStats
+
+
+class UserStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def counts(self, user):
+        db.session.expire_all()
+        return tuple(getattr(user.stats, name) for name in UserStats.counters)
+
+    def test_incremental_counts(self):
+        u1 = User(email='john@example.com', password='cat')
+        u2 = User(email='susan@example.org', password='dog')
+        db.session.add_all([u1, u2])
+        db.session.commit()
+        self.assertEqual(self.counts(u1), (0, 0, 0, 0, 0))
+
+        q = Question(title='t', body='b', author=u1)
+        a = Answer(body='a', question=q, author=u1)
+        db.session.add_all([q, a, Vote(answer=a, author=u2)])
+        u2.follow(u1)
+        db.session.commit()
+        self.assertEqual(self.counts(u1), (1, 1, 1, 0, 1))
+        self.assertEqual(self.counts(u2), (0, 0, 0, 1, 0))
+
+        u2.unfollow(u1)
+        db.session.delete(a)
+        db.session.commit()
+        self.assertEqual(self.counts(u1), (1, 0, 0, 0, 0))
+        self.assertEqual(UserStats.verify(), [])
+
+    def test_verify_and_repair(self):
+        u = User(email='john@example.com', password='cat')
+        db.session.add_all([u, Question(title='t', body='b', author=u)])
+        db.session.commit()
+        u.stats.question_count = 7
+        db.session.commit()
+        self.assertEqual(UserStats.verify(), [(u.id, 'question_count', 7, 1)])
+        UserStats.verify(repair=True)
+        self.assertEqual(self.counts(u)[0], 1)
+        self.assertEqual(UserStats.verify(), [])